@@ -0,0 +1,95 @@
+"""
+Serialization benchmark for list responses
+
+Compares the per-document cost of the old response path (to_str_id copy,
+FastAPI's jsonable_encoder, stdlib json) with the orjson path used now
+(in-place id rename, orjson with native datetime/date and an ObjectId hook).
+
+Usage:
+    python bench_serialization.py [--docs 20000] [--repeat 5]
+"""
+
+import argparse
+import copy
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from responses import dumps, id_in_place, to_str_id
+
+
+def growth_logs(n: int) -> list:
+    plant_id = str(ObjectId())
+    return [
+        {
+            "_id": ObjectId(),
+            "plant_id": plant_id,
+            "observed_at": datetime(2024, 1, 1) + timedelta(days=i % 365),
+            "height_cm": 10.0 + i % 90,
+            "leaves_count": i % 40,
+            "stage": "vegetative",
+            "notes": "Leaves healthy, slight yellowing on the lower branches after irrigation.",
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+        for i in range(n)
+    ]
+
+
+def sensor_readings(n: int) -> list:
+    plant_id = str(ObjectId())
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "plant_id": plant_id,
+            "recorded_at": start + timedelta(minutes=i),
+            "temperature_c": 21.5 + (i % 10) / 10,
+            "humidity_pct": 60.0,
+            "soil_moisture_pct": 35.0 + i % 5,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+        for i in range(n)
+    ]
+
+
+def old_path(docs: list) -> bytes:
+    content = jsonable_encoder([to_str_id(doc) for doc in docs])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def new_path(docs: list) -> bytes:
+    return dumps([id_in_place(doc) for doc in docs])
+
+
+def measure(fn, docs: list, repeat: int) -> float:
+    """Best-of-repeat microseconds per document; each run gets fresh documents"""
+    best = float("inf")
+    for _ in range(repeat):
+        batch = copy.deepcopy(docs)
+        t0 = time.perf_counter()
+        fn(batch)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(docs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'collection':<16}{'before us/doc':>15}{'after us/doc':>15}{'speedup':>10}")
+    for name, factory in (("growthlog", growth_logs), ("sensorreading", sensor_readings)):
+        docs = factory(args.docs)
+        before = measure(old_path, docs, args.repeat)
+        after = measure(new_path, docs, args.repeat)
+        print(f"{name:<16}{before:>15.2f}{after:>15.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
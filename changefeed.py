@@ -0,0 +1,178 @@
+"""
+MongoDB change-stream watcher feeding the in-process broker
+
+With several uvicorn workers, a reading ingested by one worker must reach
+live subscribers connected to the others. Each process runs one watcher
+thread on the database's change stream, filtered to inserts into the
+watched collections, and hands every inserted document to a callback.
+
+The last resume token is persisted in ``changestream_state`` so a
+restarted process continues where it stopped (if the token is recent
+enough to be useful) instead of missing or replaying a large window.
+Unless LIVE_WATCHER_ID names it, each worker leases a slot ``host:N``
+(the lowest free one) and keeps the token there; a restarted worker picks
+up a slot whose lease lapsed and resumes from its token. Every watcher sees
+the same stream, so any recent token is a valid starting point. Slots
+unused for a day are removed by a TTL index on ``lease_until``. A token the
+server can no longer resume from is dropped and the stream restarts at the
+current point.
+Change streams need a replica set or sharded cluster; a single-node
+replica set is enough locally.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable
+
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+import database
+from database import get_document, update_document
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "changestream_state"
+# ChangeStreamHistoryLost, ChangeStreamFatalError, InvalidResumeToken
+RESUME_FAILURE_CODES = {280, 286, 260}
+MAX_SLOTS = 256
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ChangeStreamWatcher:
+    def __init__(
+        self,
+        collections: Iterable[str],
+        callback: Callable[[str, dict], None],
+        watcher_id: str = None,
+        persist_every_s: float = 5.0,
+        resume_max_age: timedelta = timedelta(minutes=10),
+        lease: timedelta = timedelta(seconds=30),
+    ):
+        self.collections = list(collections)
+        self.callback = callback
+        # None until a slot is leased
+        self.watcher_id = watcher_id or os.getenv("LIVE_WATCHER_ID")
+        self._leased = self.watcher_id is None
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease
+        self.persist_every = persist_every_s
+        self.resume_max_age = resume_max_age
+        self._token = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.events = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="changefeed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._leased and self.watcher_id is not None:
+            try:
+                self._persist_token()
+                # Hand the slot and its token straight to the next worker
+                update_document(STATE_COLLECTION, {"_id": self.watcher_id, "owner": self.owner},
+                                {"$set": {"lease_until": EPOCH}})
+            except PyMongoError as e:
+                logger.warning("changefeed: could not release slot %s: %s", self.watcher_id, e)
+
+    def status(self) -> dict:
+        return {"watcher_id": self.watcher_id, "collections": self.collections, "events": self.events}
+
+    def _claim_slot(self) -> str:
+        host = socket.gethostname()
+        now = datetime.now(timezone.utc)
+        for n in range(MAX_SLOTS):
+            slot = f"{host}:{n}"
+            try:
+                if update_document(
+                    STATE_COLLECTION,
+                    {"_id": slot, "$or": [{"lease_until": {"$lt": now}}, {"owner": self.owner}, {"lease_until": {"$exists": False}}]},
+                    {"$set": {"owner": self.owner, "lease_until": now + self.lease}},
+                    upsert=True,
+                ) > 0:
+                    return slot
+            except DuplicateKeyError:
+                # Leased by a live worker
+                continue
+        logger.warning("changefeed: all %d slots on %s are leased; using %s", MAX_SLOTS, host, self.owner)
+        return self.owner
+
+    def _load_token(self):
+        state = get_document(STATE_COLLECTION, {"_id": self.watcher_id})
+        if not state:
+            return None
+        saved_at = state.get("updated_at")
+        if saved_at is not None and saved_at.tzinfo is None:
+            saved_at = saved_at.replace(tzinfo=timezone.utc)
+        if saved_at is None or datetime.now(timezone.utc) - saved_at > self.resume_max_age:
+            # Nobody is subscribed to that old a window any more
+            return None
+        return state.get("token")
+
+    def _persist_token(self):
+        now = datetime.now(timezone.utc)
+        fields = {}
+        if self._token is not None:
+            fields.update(token=self._token, updated_at=now)
+        if self._leased:
+            fields["lease_until"] = now + self.lease
+        if fields:
+            update_document(STATE_COLLECTION, {"_id": self.watcher_id}, {"$set": fields}, upsert=True)
+
+    def _reset_token(self):
+        self._token = None
+        try:
+            update_document(STATE_COLLECTION, {"_id": self.watcher_id}, {"$unset": {"token": ""}})
+        except PyMongoError as e:
+            logger.warning("changefeed: could not drop saved resume token: %s", e)
+
+    def _run(self):
+        pipeline = [{"$match": {"operationType": "insert", "ns.coll": {"$in": self.collections}}}]
+        while not self._stop.is_set():
+            if database.db is None:
+                self._stop.wait(1.0)
+                continue
+            try:
+                if self.watcher_id is None:
+                    self.watcher_id = self._claim_slot()
+                    logger.info("changefeed: leased slot %s", self.watcher_id)
+                if self._token is None:
+                    self._token = self._load_token()
+                persisted_at = time.monotonic()
+                with database.db.watch(pipeline, resume_after=self._token, max_await_time_ms=1000) as stream:
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self.events += 1
+                            try:
+                                self.callback(change["ns"]["coll"], change["fullDocument"])
+                            except Exception as e:
+                                logger.error("changefeed: callback failed: %s", e)
+                        self._token = stream.resume_token
+                        if time.monotonic() - persisted_at >= self.persist_every:
+                            self._persist_token()
+                            persisted_at = time.monotonic()
+                self._persist_token()
+            except OperationFailure as e:
+                if self._token is not None and e.code in RESUME_FAILURE_CODES:
+                    # The token can never resume; start from the current point instead of retrying it forever
+                    logger.warning("changefeed: resume token unusable, starting fresh: %s", e)
+                    self._reset_token()
+                else:
+                    logger.warning("changefeed: stream interrupted, reconnecting: %s", e)
+                self._stop.wait(2.0)
+            except PyMongoError as e:
+                logger.warning("changefeed: stream interrupted, reconnecting: %s", e)
+                self._stop.wait(2.0)
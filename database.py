@@ -5,11 +5,17 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
-from datetime import datetime, timezone
+from pymongo import MongoClient, monitoring
+from pymongo.errors import BulkWriteError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timezone
+import asyncio
+import functools
+import itertools
 import os
+import threading
 from dotenv import load_dotenv
-from typing import Union
+from typing import Optional, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -21,9 +27,140 @@ db = None
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+
+def client_options() -> dict:
+    """MongoClient pool, timeout and compression settings from the environment"""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        # Fail fast instead of pymongo's 30s default when no server is reachable
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    }
+    if os.getenv("MONGO_SOCKET_TIMEOUT_MS"):
+        options["socketTimeoutMS"] = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS"))
+    if os.getenv("MONGO_MAX_IDLE_TIME_MS"):
+        options["maxIdleTimeMS"] = int(os.getenv("MONGO_MAX_IDLE_TIME_MS"))
+    if os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS"):
+        options["waitQueueTimeoutMS"] = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS"))
+    if os.getenv("MONGO_COMPRESSORS"):
+        # e.g. "zstd,snappy,zlib"; zstd needs the zstandard package, snappy python-snappy
+        options["compressors"] = os.getenv("MONGO_COMPRESSORS")
+    return options
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters collected from pymongo pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def _add(self, field: str, delta: int):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+
+    def pool_cleared(self, event):
+        self._add("pool_clears", 1)
+
+    def connection_created(self, event):
+        self._add("open", 1)
+
+    def connection_ready(self, event): pass
+
+    def connection_closed(self, event):
+        self._add("open", -1)
+
+    def connection_check_out_started(self, event):
+        self._add("waiting", 1)
+
+    def connection_check_out_failed(self, event):
+        self._add("waiting", -1)
+        self._add("checkout_failures", 1)
+
+    def connection_checked_out(self, event):
+        self._add("waiting", -1)
+        self._add("in_use", 1)
+
+    def connection_checked_in(self, event):
+        self._add("in_use", -1)
+
+    def snapshot(self, max_pool_size: int) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": max_pool_size,
+                "open": self.open,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "utilization": round(self.in_use / max_pool_size, 3) if max_pool_size else None,
+            }
+
+
+pool_stats = PoolStats()
+_client_options = client_options()
+_init_lock = threading.Lock()
+
+# Database readiness: "not_configured", "starting", "ready" or "unavailable"
+readiness = {"state": "starting" if database_url and database_name else "not_configured", "error": None}
+
+
+def init_db() -> bool:
+    """Create the client on first call and ping the server.
+
+    Nothing connects at import time; the app's lifespan hook (or a CLI
+    command) calls this. Returns False when DATABASE_URL / DATABASE_NAME
+    are not set and raises if the server cannot be reached.
+    """
+    global _client, db
+    if not (database_url and database_name):
+        return False
+    with _init_lock:
+        if _client is None:
+            _client = MongoClient(database_url, event_listeners=[pool_stats], **_client_options)
+            db = _client[database_name]
+    _client.admin.command("ping")
+    return True
+
+
+def close_db():
+    global _client, db
+    with _init_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        db = None
+    set_readiness("starting" if database_url and database_name else "not_configured")
+
+
+def set_readiness(state: str, error: str = None):
+    readiness["state"] = state
+    readiness["error"] = error
+
+
+def is_ready() -> bool:
+    return readiness["state"] == "ready"
+
+
+def get_pool_stats() -> dict:
+    """Pool utilization summed over all servers the client talks to"""
+    return pool_stats.snapshot(_client_options["maxPoolSize"])
+
+def _bson_dates(data_dict: dict) -> dict:
+    """BSON has no date-only type; store dates as midnight UTC datetimes so they stay range-queryable"""
+    for key, value in data_dict.items():
+        if isinstance(value, date) and not isinstance(value, datetime):
+            data_dict[key] = datetime.combine(value, time.min)
+    return data_dict
 
 # Helper functions for common database operations
 def create_document(collection_name: str, data: Union[BaseModel, dict]):
@@ -37,19 +174,170 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     else:
         data_dict = data.copy()
 
+    _bson_dates(data_dict)
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
     result = db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+def create_documents(collection_name: str, items: list):
+    """Insert many documents with timestamps in a single unordered batch.
+
+    Returns a list aligned with ``items`` of ``(id, error)`` tuples, where
+    exactly one of the two is set for every item.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if not items:
+        return []
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for data in items:
+        data_dict = _bson_dates(data.model_dump() if isinstance(data, BaseModel) else data.copy())
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        docs.append(data_dict)
+
+    # insert_many assigns _id on each dict before sending, so ids are known
+    # even for items that end up failing
+    errors = {}
+    try:
+        db[collection_name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            errors[err["index"]] = err.get("errmsg", "write error")
+
+    return [
+        (None, errors[i]) if i in errors else (str(doc["_id"]), None)
+        for i, doc in enumerate(docs)
+    ]
+
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, sort: list = None, projection: dict = None):
+    """Get documents from collection, optionally sorted server-side"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
     
     return list(cursor)
+
+def iter_documents(collection_name: str, filter_dict: dict = None, sort: list = None, projection: dict = None,
+                   batch_size: int = 1000, limit: int = None):
+    """Yield documents one at a time; the cursor fetches batch_size per round trip"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = db[collection_name].find(filter_dict or {}, projection, batch_size=batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+def get_document(collection_name: str, filter_dict: dict):
+    """Get a single document or None"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return db[collection_name].find_one(filter_dict)
+
+def update_document(collection_name: str, filter_dict: dict, update: dict, upsert: bool = False):
+    """Apply an update operator document to the first matching document"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = db[collection_name].update_one(filter_dict, update, upsert=upsert)
+    return result.modified_count + (1 if result.upserted_id is not None else 0)
+
+def bulk_write(collection_name: str, operations: list):
+    """Send a list of pymongo write operations (UpdateOne, ReplaceOne, ...) in one unordered batch"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if not operations:
+        return None
+
+    return db[collection_name].bulk_write(operations, ordered=False)
+
+def aggregate(collection_name: Optional[str], pipeline: list):
+    """Run an aggregation pipeline and return the resulting documents.
+
+    With ``collection_name=None`` the pipeline runs against the database,
+    for pipelines that start with ``$documents``.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    target = db if collection_name is None else db[collection_name]
+    return list(target.aggregate(pipeline))
+
+def ensure_indexes(specs: list):
+    """Create every index in ``specs`` (schemas.IndexSpec); existing ones are left alone"""
+    if db is None:
+        return
+    for spec in specs:
+        options = {"expireAfterSeconds": spec.expire_after_s} if spec.expire_after_s is not None else {}
+        db[spec.collection].create_index(spec.keys, name=spec.name, unique=spec.unique, **options)
+
+def index_report(specs: list) -> dict:
+    """Per collection: declared indexes that are missing, and existing indexes with usage counts"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    report = {}
+    for collection in sorted({spec.collection for spec in specs}):
+        declared = {spec.name for spec in specs if spec.collection == collection}
+        existing = db[collection].index_information()
+        try:
+            usage = {s["name"]: s["accesses"]["ops"] for s in db[collection].aggregate([{"$indexStats": {}}])}
+        except Exception:
+            # $indexStats is not available on every deployment (e.g. time-series views)
+            usage = {}
+        report[collection] = {
+            "missing": sorted(declared - set(existing)),
+            "indexes": [
+                {"name": name, "declared": name in declared or name == "_id_", "ops": usage.get(name)}
+                for name in sorted(existing)
+            ],
+        }
+    return report
+
+# Async facade: pymongo is blocking, so async endpoints hand calls to a
+# dedicated executor instead of Starlette's shared threadpool. Waiting
+# requests cost a coroutine, not a thread, while MongoDB is slow.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_THREADS", _client_options["maxPoolSize"])),
+    thread_name_prefix="mongo",
+)
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking database function on the database executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+async def acreate_document(collection_name: str, data: Union[BaseModel, dict]):
+    return await run_db(create_document, collection_name, data)
+
+async def aget_documents(collection_name: str, filter_dict: dict = None, limit: int = None, sort: list = None, projection: dict = None):
+    return await run_db(get_documents, collection_name, filter_dict, limit, sort, projection)
+
+async def aiter_document_batches(collection_name: str, filter_dict: dict = None, sort: list = None,
+                                 projection: dict = None, batch_size: int = 1000, limit: int = None):
+    """Async iterator over lists of up to batch_size documents, each fetched on the executor"""
+    docs = iter_documents(collection_name, filter_dict, sort, projection, batch_size, limit)
+    try:
+        while True:
+            batch = await run_db(lambda: list(itertools.islice(docs, batch_size)))
+            if not batch:
+                return
+            yield batch
+    finally:
+        await run_db(docs.close)
@@ -0,0 +1,173 @@
+"""
+Hourly and daily downsampled sensor reading rollups
+
+A background worker aggregates new sensor readings into
+``sensorreading_1h`` and ``sensorreading_1d``: one document per plant per
+bucket with count/min/max/mean of every metric. Only readings whose
+``created_at`` lies past the stored watermark are processed, and results
+are folded into existing buckets with ``$merge``, so late readings for old
+buckets are still counted. A lease in ``rollup_state`` keeps several
+workers from processing the same window twice.
+"""
+
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+import reading_store
+from database import get_document, get_documents, update_document
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "rollup_state"
+METRICS = ("temperature_c", "humidity_pct", "soil_moisture_pct")
+# resolution -> (collection, $dateTrunc unit)
+RESOLUTIONS = {
+    "1h": ("sensorreading_1h", "hour"),
+    "1d": ("sensorreading_1d", "day"),
+}
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _group_stage(unit: str) -> dict:
+    group = {
+        "_id": {
+            "plant_id": "$plant_id",
+            "bucket_start": {"$dateTrunc": {"date": "$recorded_at", "unit": unit}},
+        },
+        "count": {"$sum": 1},
+    }
+    for m in METRICS:
+        group[f"{m}_count"] = {"$sum": {"$cond": [{"$isNumber": f"${m}"}, 1, 0]}}
+        group[f"{m}_sum"] = {"$sum": f"${m}"}
+        group[f"{m}_min"] = {"$min": f"${m}"}
+        group[f"{m}_max"] = {"$max": f"${m}"}
+    return {"$group": group}
+
+
+def _mean_stage() -> dict:
+    return {"$set": {
+        f"{m}_mean": {"$cond": [
+            {"$gt": [f"${m}_count", 0]},
+            {"$divide": [f"${m}_sum", f"${m}_count"]},
+            None,
+        ]}
+        for m in METRICS
+    }}
+
+
+def _merge_stage(collection: str) -> dict:
+    combine = {"count": {"$add": ["$count", "$$new.count"]}}
+    for m in METRICS:
+        combine[f"{m}_count"] = {"$add": [f"${m}_count", f"$$new.{m}_count"]}
+        combine[f"{m}_sum"] = {"$add": [f"${m}_sum", f"$$new.{m}_sum"]}
+        combine[f"{m}_min"] = {"$min": [f"${m}_min", f"$$new.{m}_min"]}
+        combine[f"{m}_max"] = {"$max": [f"${m}_max", f"$$new.{m}_max"]}
+    return {"$merge": {
+        "into": collection,
+        "on": ["plant_id", "bucket_start"],
+        "whenMatched": [{"$set": combine}, _mean_stage()],
+        "whenNotMatched": "insert",
+    }}
+
+
+def rollup_stages(resolution: str) -> list:
+    collection, unit = RESOLUTIONS[resolution]
+    return [
+        _group_stage(unit),
+        {"$set": {"plant_id": "$_id.plant_id", "bucket_start": "$_id.bucket_start"}},
+        {"$unset": "_id"},
+        _mean_stage(),
+        _merge_stage(collection),
+    ]
+
+
+def _acquire_lease(name: str, owner: str, ttl: timedelta) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        return update_document(
+            STATE_COLLECTION,
+            {"_id": name, "$or": [{"lease_until": {"$lt": now}}, {"owner": owner}, {"lease_until": {"$exists": False}}]},
+            {"$set": {"owner": owner, "lease_until": now + ttl}},
+            upsert=True,
+        ) > 0
+    except DuplicateKeyError:
+        # Another worker holds an unexpired lease
+        return False
+
+
+def run_rollup(resolution: str, owner: str, lag: timedelta = timedelta(seconds=10), lease: timedelta = timedelta(minutes=5)) -> bool:
+    """Process readings created since the watermark; returns False if another worker holds the lease.
+
+    The watermark trails now by ``lag`` so inserts still in flight are not
+    skipped. A crash between the merge and the watermark update re-counts
+    that window once.
+    """
+    name = RESOLUTIONS[resolution][0]
+    if not _acquire_lease(name, owner, lease):
+        return False
+    state = get_document(STATE_COLLECTION, {"_id": name}) or {}
+    start = state.get("watermark") or EPOCH
+    end = datetime.now(timezone.utc) - lag
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end > start:
+        reading_store.aggregate({"created_at": {"$gt": start, "$lte": end}}, rollup_stages(resolution))
+        update_document(STATE_COLLECTION, {"_id": name}, {"$set": {"watermark": end}})
+    update_document(STATE_COLLECTION, {"_id": name}, {"$set": {"lease_until": EPOCH}})
+    return True
+
+
+def pick_resolution(start: datetime, end: datetime) -> str:
+    """Raw points up to two days, hourly up to two months, daily beyond"""
+    span = end - start
+    if span <= timedelta(days=2):
+        return "raw"
+    if span <= timedelta(days=60):
+        return "1h"
+    return "1d"
+
+
+def get_rollups(plant_id: str, resolution: str, start: datetime, end: datetime) -> list:
+    collection = RESOLUTIONS[resolution][0]
+    docs = get_documents(
+        collection,
+        {"plant_id": plant_id, "bucket_start": {"$gte": start, "$lt": end}},
+        sort=[("bucket_start", 1)],
+    )
+    for doc in docs:
+        doc.pop("_id", None)
+    return docs
+
+
+class DownsampleWorker:
+    def __init__(self, interval_s: float = 60.0):
+        self.interval = interval_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="downsample", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for resolution in RESOLUTIONS:
+                try:
+                    run_rollup(resolution, self.owner)
+                except Exception as e:
+                    logger.warning("downsample: %s rollup failed: %s", resolution, e)
@@ -0,0 +1,145 @@
+"""
+In-process cache of the most recent sensor readings per plant
+
+Each plant gets a bounded buffer of its newest readings. A buffer is warmed
+from MongoDB on first access and afterwards kept current by ``add`` as
+readings are ingested, so dashboard polling rarely reaches the database.
+The cache is per process, so readings written elsewhere (another worker,
+spool replay, scripts) are not seen by ``add``; a buffer older than ``ttl``
+seconds is therefore refreshed on its next read. With a ``refresher`` only
+readings newer than the buffer's newest one are fetched (backfilled older
+readings then show up once the buffer is evicted); without one, or when
+the refresh comes back full, the buffer is reloaded.
+"""
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+
+def sort_key(ts: datetime, id=None):
+    """Buffer ordering key; without an id it sorts after every reading at ``ts``"""
+    ts = ts or datetime.min
+    if ts.tzinfo is not None:
+        # MongoDB hands back naive UTC datetimes; compare like with like
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return (ts, str(id) if id is not None else "\uffff")
+
+
+def _sort_key(doc: dict):
+    return sort_key(doc.get("recorded_at"), doc.get("_id", ""))
+
+
+class LatestReadingsCache:
+    def __init__(self, loader: Callable[[str, int], List[dict]], size: int = 200, max_plants: int = 10000,
+                 ttl: float = 5.0, refresher: Optional[Callable[[str, dict, int], List[dict]]] = None):
+        self.loader = loader
+        # (plant_id, newest buffered doc, limit) -> up to limit readings newer than it
+        self.refresher = refresher
+        self.size = size
+        self.max_plants = max_plants
+        self.ttl = ttl
+        # plant_id -> (keys, docs), both oldest first
+        self._buffers = OrderedDict()
+        # plant_id -> monotonic time the buffer was loaded
+        self._loaded_at = {}
+        # plant_id -> readings added while the buffer was being warmed
+        self._warming = {}
+        self._lock = threading.Lock()
+
+    def add(self, docs: List[dict]):
+        with self._lock:
+            for doc in docs:
+                plant_id = doc.get("plant_id")
+                if plant_id in self._warming:
+                    self._warming[plant_id].append(doc)
+                elif plant_id in self._buffers:
+                    self._insert(plant_id, doc)
+
+    def cached(self, plant_id: str, limit: int, since: tuple = None):
+        """Newest-first readings if the plant's buffer is warm and fresh, else None; never touches the database.
+
+        With ``since`` (a ``sort_key``), the oldest ``limit`` readings ordered
+        after it are returned instead, or None if the buffer no longer
+        reaches back to ``since``.
+        """
+        with self._lock:
+            if not self._fresh(plant_id):
+                return None
+            self._buffers.move_to_end(plant_id)
+            return self._slice(plant_id, limit, since)
+
+    def latest(self, plant_id: str, limit: int, since: tuple = None) -> List[dict]:
+        """Newest-first readings for a plant, warming its buffer if needed."""
+        with self._lock:
+            if self._fresh(plant_id):
+                self._buffers.move_to_end(plant_id)
+                return self._slice(plant_id, limit, since)
+            self._warming.setdefault(plant_id, [])
+            loaded_at = time.monotonic()
+            buffered = self._buffers.get(plant_id)
+            newest = buffered[1][-1] if buffered and buffered[1] else None
+
+        newer = None
+        try:
+            if newest is not None and self.refresher is not None:
+                newer = self.refresher(plant_id, newest, self.size)
+                if len(newer) >= self.size:
+                    # Too far behind to patch; there may be more
+                    newer = None
+            docs = self.loader(plant_id, self.size) if newer is None else newer
+        except Exception:
+            with self._lock:
+                self._warming.pop(plant_id, None)
+            raise
+
+        with self._lock:
+            pending = self._warming.pop(plant_id, [])
+            if newer is not None and plant_id in self._buffers:
+                for doc in newer:
+                    self._insert(plant_id, doc)
+                self._buffers.move_to_end(plant_id)
+                self._loaded_at[plant_id] = loaded_at
+            elif not self._fresh(plant_id):
+                ordered = sorted(docs, key=_sort_key)
+                self._buffers[plant_id] = ([_sort_key(d) for d in ordered], ordered)
+                self._buffers.move_to_end(plant_id)
+                self._loaded_at[plant_id] = loaded_at
+                while len(self._buffers) > self.max_plants:
+                    evicted, _ = self._buffers.popitem(last=False)
+                    self._loaded_at.pop(evicted, None)
+            for doc in pending:
+                self._insert(plant_id, doc)
+            return self._slice(plant_id, limit, since)
+
+    def _fresh(self, plant_id: str) -> bool:
+        if plant_id not in self._buffers:
+            return False
+        return not self.ttl or time.monotonic() - self._loaded_at[plant_id] < self.ttl
+
+    def _insert(self, plant_id: str, doc: dict):
+        keys, docs = self._buffers[plant_id]
+        key = _sort_key(doc)
+        i = bisect.bisect_right(keys, key)
+        if i > 0 and keys[i - 1] == key:
+            return
+        keys.insert(i, key)
+        docs.insert(i, doc)
+        if len(docs) > self.size:
+            del keys[0]
+            del docs[0]
+
+    def _slice(self, plant_id: str, limit: int, since: tuple = None):
+        keys, docs = self._buffers[plant_id]
+        if limit <= 0:
+            return []
+        if since is None:
+            return docs[-limit:][::-1]
+        if len(docs) >= self.size and keys and since < keys[0]:
+            # Older readings were evicted; some of those after `since` may be missing
+            return None
+        start = bisect.bisect_right(keys, since)
+        return docs[start:start + limit][::-1]
@@ -0,0 +1,120 @@
+"""
+In-process pub/sub for live sensor updates
+
+Publishers (ingest handlers, background threads) push events to topics,
+usually a plant id. Each subscriber owns a bounded asyncio queue; when a
+slow client falls behind, its oldest queued events are dropped and counted
+so the client can be told it missed updates, and nobody else is slowed
+down. Events are encoded once at publish time and shared by subscribers.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Iterable, Optional
+
+
+class Event:
+    """A published update; ``doc`` is shared between subscribers and must not be mutated"""
+    __slots__ = ("topic", "kind", "id", "data", "doc")
+
+    def __init__(self, topic: str, kind: str, id: str, data: bytes, doc: dict = None):
+        self.topic = topic
+        self.kind = kind
+        self.id = id
+        self.data = data
+        self.doc = doc
+
+
+class Subscription:
+    def __init__(self, broker: "Broker", topics: Iterable[str], maxsize: int):
+        self.broker = broker
+        self.topics = set(topics)
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _deliver(self, event: Event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """Next event, or None if ``timeout`` passes first or the subscription was closed"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def take_dropped(self) -> int:
+        n, self.dropped = self.dropped, 0
+        return n
+
+    def drain(self) -> list:
+        """Everything queued right now, without waiting"""
+        events = []
+        while not self.queue.empty():
+            event = self.queue.get_nowait()
+            if event is not None:
+                events.append(event)
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+        if not self.queue.full():
+            # Wake a reader blocked in get()
+            self.queue.put_nowait(None)
+
+
+class Broker:
+    def __init__(self):
+        self._subs = defaultdict(set)
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Remember the event loop subscribers live on, so threads can publish"""
+        self._loop = loop
+
+    def subscribe(self, topics: Iterable[str], maxsize: int = 100) -> Subscription:
+        sub = Subscription(self, topics, maxsize)
+        with self._lock:
+            for topic in sub.topics:
+                self._subs[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._subs.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._subs
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({sub for subs in self._subs.values() for sub in subs})
+
+    def publish(self, event: Event):
+        """Fan an event out to the topic's subscribers; safe to call from any thread"""
+        with self._lock:
+            subs = list(self._subs.get(event.topic, ()))
+        if not subs or self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(subs, event)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, subs, event)
+
+    @staticmethod
+    def _deliver(subs, event: Event):
+        for sub in subs:
+            sub._deliver(event)
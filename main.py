@@ -1,15 +1,123 @@
 import os
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime, date
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, List, Optional
+from datetime import datetime, date, timezone
 
-from database import db, create_document, get_documents
-from schemas import Plant, GrowthLog, SensorReading
+import database
+from database import acreate_document, aget_documents, aiter_document_batches, ensure_indexes, get_pool_stats, run_db
+from schemas import Plant, GrowthLog, SensorReading, INDEXES
+from write_behind import WriteBehindBuffer
+from spool import Spool
+from latest_cache import LatestReadingsCache, sort_key
+from stats import compute_plant_stats, time_range
+import rollups
+import reading_store
+from downsample import DownsampleWorker, RESOLUTIONS, get_rollups, pick_resolution
+from pagination import after_id_filter, before_filter, decode_cursor, encode_cursor, newer_filter
+from responses import FastJSONResponse, dumps, id_in_place, to_str_id
+from live import Broker, Event
+from changefeed import ChangeStreamWatcher
 from bson import ObjectId
 
-app = FastAPI(title="Coffee Growth Tracker API")
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 5000))
+NDJSON_CHUNK_SIZE = int(os.getenv("NDJSON_CHUNK_SIZE", 500))
+NDJSON_MAX_LINE_BYTES = 64 * 1024
+NDJSON_MAX_ERRORS = 100
+LATEST_LIMIT_MAX = 200
+LATEST_BULK_MAX_PLANTS = int(os.getenv("LATEST_BULK_MAX_PLANTS", 1000))
+HISTORY_RAW_MAX_POINTS = 10000
+LIST_BATCH_SIZE = int(os.getenv("LIST_BATCH_SIZE", 1000))
+PAGE_LIMIT_MAX = 1000
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", 100))
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", 15))
+WS_MAX_FPS = float(os.getenv("WS_MAX_FPS", 10))
+WS_MAX_PLANTS = int(os.getenv("WS_MAX_PLANTS", 2000))
+# Maintain plantstats rollups on write and serve /stats/plant from them
+PLANT_STATS_ROLLUP = os.getenv("PLANT_STATS_ROLLUP", "1").lower() in ("1", "true", "yes")
+DB_CONNECT_RETRY_S = float(os.getenv("DB_CONNECT_RETRY_S", 5))
+
+
+def prepare_collections():
+    try:
+        reading_store.ensure_collections()
+    except Exception as e:
+        logger.error("collection setup failed: %s", e)
+
+
+def prepare_indexes():
+    """Create the declared indexes one by one.
+
+    Failures (e.g. duplicates blocking a unique index) are logged and
+    tolerated: the API works without them, and retrying would not help.
+    """
+    for spec in reading_store.active_indexes(INDEXES):
+        try:
+            ensure_indexes([spec])
+        except Exception as e:
+            logger.error("index %s.%s not created: %s", spec.collection, spec.name, e)
+
+
+async def connect_database():
+    """Bring the database up in the background, retrying until it answers.
+
+    Requests are served meanwhile: readings go to the spool, and /ready
+    reports 503 until the server answers a ping.
+    """
+    while True:
+        try:
+            if not await run_db(database.init_db):
+                logger.warning("DATABASE_URL / DATABASE_NAME not set; running without a database")
+                return
+        except Exception as e:
+            database.set_readiness("unavailable", str(e)[:200])
+            logger.warning("database not ready, retrying in %ss: %s", DB_CONNECT_RETRY_S, e)
+            await asyncio.sleep(DB_CONNECT_RETRY_S)
+            continue
+        # Time-series storage must exist before the first insert creates a plain collection
+        await run_db(prepare_collections)
+        database.set_readiness("ready")
+        logger.info("database ready")
+        await run_db(prepare_indexes)
+        return
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    broker.bind(asyncio.get_running_loop())
+    connect_task = asyncio.create_task(connect_database())
+    if spool is not None:
+        spool.start()
+    if write_behind is not None:
+        write_behind.start()
+    if downsample_worker is not None:
+        downsample_worker.start()
+    if change_watcher is not None:
+        change_watcher.start()
+    try:
+        yield
+    finally:
+        connect_task.cancel()
+        if change_watcher is not None:
+            change_watcher.stop()
+        if downsample_worker is not None:
+            downsample_worker.stop()
+        if write_behind is not None:
+            write_behind.stop()
+        if spool is not None:
+            spool.stop()
+        database.close_db()
+
+
+app = FastAPI(title="Coffee Growth Tracker API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,30 +125,274 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Latest-Cursor", "ETag"],
 )
 
 
+def write_readings(docs: List[dict], dedupe: bool = False):
+    """Persist already-validated reading documents in one bulk insert."""
+    results = reading_store.insert(docs, dedupe)
+    failed = [err for _, err in results if err]
+    if failed:
+        logger.warning("sensorreading: %d of %d documents rejected, first error: %s", len(failed), len(docs), failed[0])
+    if PLANT_STATS_ROLLUP:
+        try:
+            rollups.apply_readings([doc for doc, (_, err) in zip(docs, results) if not err])
+        except Exception as e:
+            # The readings are stored; a rebuild-stats run repairs the rollup
+            logger.error("plantstats: rollup update failed: %s", e)
+    return results
+
+
+def store_readings(docs: List[dict]):
+    """Write readings to MongoDB, spooling them to local disk if that fails.
+
+    Ids are assigned up front so spooled readings keep the id returned to
+    the client and replays are idempotent.
+    """
+    for doc in docs:
+        doc.setdefault("_id", ObjectId())
+    try:
+        return write_readings(docs)
+    except Exception as e:
+        if spool is None:
+            raise
+        logger.warning("sensorreading: write failed, spooling %d readings: %s", len(docs), e)
+        spool.append(docs)
+        return [(str(doc["_id"]), None) for doc in docs]
+
+
+def replay_readings(docs: List[dict]):
+    """Spool replay writer; a segment replayed twice must not store readings twice"""
+    return write_readings(docs, dedupe=True)
+
+
+# Local disk spool that keeps readings through database outages and
+# replays them once writes succeed again. Set SENSOR_SPOOL_DIR="" to disable.
+spool = None
+if os.getenv("SENSOR_SPOOL_DIR", "spool"):
+    spool = Spool(
+        os.getenv("SENSOR_SPOOL_DIR", "spool"),
+        replay_readings,
+        fsync_every=int(os.getenv("SENSOR_SPOOL_FSYNC_EVERY", 256)),
+        fsync_interval_ms=int(os.getenv("SENSOR_SPOOL_FSYNC_INTERVAL_MS", 100)),
+        replay_interval_s=float(os.getenv("SENSOR_SPOOL_REPLAY_INTERVAL_S", 5)),
+    )
+
+def load_latest_readings(plant_id: str, limit: int):
+    return reading_store.latest(plant_id, limit)
+
+
+def load_newer_readings(plant_id: str, newest: dict, limit: int):
+    return reading_store.oldest(plant_id, limit, newer_filter(newest["_id"], newest.get("recorded_at")))
+
+
+# Per-plant buffers of the newest readings, kept current on ingest so
+# GET /sensor-readings/latest is served from memory. After LATEST_CACHE_TTL_S
+# a buffer fetches readings newer than its newest one, so writes from other
+# workers show up; raise it when LIVE_CHANGE_STREAM feeds every worker's
+# cache. LATEST_CACHE_SIZE=0 disables.
+latest_cache = None
+if int(os.getenv("LATEST_CACHE_SIZE", LATEST_LIMIT_MAX)) > 0:
+    latest_cache = LatestReadingsCache(
+        load_latest_readings,
+        size=int(os.getenv("LATEST_CACHE_SIZE", LATEST_LIMIT_MAX)),
+        max_plants=int(os.getenv("LATEST_CACHE_MAX_PLANTS", 10000)),
+        ttl=float(os.getenv("LATEST_CACHE_TTL_S", 5)),
+        refresher=load_newer_readings,
+    )
+
+
+# Fan-out of accepted readings to live subscribers, keyed by plant_id
+broker = Broker()
+
+
+def publish_documents(kind: str, docs: List[dict]):
+    for doc in docs:
+        plant_id = doc.get("plant_id")
+        if broker.has_subscribers(plant_id):
+            payload = to_str_id(doc)
+            broker.publish(Event(plant_id, kind, str(payload.get("id")), dumps(payload), payload))
+
+
+def on_readings_accepted(docs: List[dict]):
+    """Hook run for readings that were stored, spooled or queued for writing."""
+    # Shape them like readings loaded back from MongoDB, so responses and events never mix the two
+    now = datetime.now(timezone.utc)
+    docs = [reading_store.as_stored(doc, now) for doc in docs]
+    if latest_cache is not None:
+        latest_cache.add(docs)
+    if reading_store.COLLECTION not in changefeed_collections:
+        publish_documents("reading", docs)
+
+
+def on_database_change(collection: str, doc: dict):
+    """Inserts seen on the change stream, from this worker or any other"""
+    if collection == reading_store.COLLECTION:
+        if latest_cache is not None:
+            # Readings this worker ingested itself are already buffered; the cache skips duplicates
+            latest_cache.add([doc])
+        publish_documents("reading", [doc])
+    else:
+        publish_documents("growthlog", [doc])
+
+
+# Optional change-stream watcher (LIVE_CHANGE_STREAM=1) so live subscribers
+# on every worker see inserts made by any worker. Requires a replica set.
+change_watcher = None
+changefeed_collections = []
+if os.getenv("LIVE_CHANGE_STREAM", "").lower() in ("1", "true", "yes"):
+    changefeed_collections = ["growthlog"]
+    if reading_store.STORAGE_MODE == "document":
+        changefeed_collections.append(reading_store.COLLECTION)
+    else:
+        # Bucket updates and time-series inserts do not surface as per-reading insert events
+        logger.warning("LIVE_CHANGE_STREAM: readings are only published locally with SENSOR_STORAGE=%s",
+                       reading_store.STORAGE_MODE)
+    change_watcher = ChangeStreamWatcher(changefeed_collections, on_database_change)
+
+
+# Optional write-behind buffer: single-reading ingest returns once the
+# reading is queued, and a background thread bulk-inserts the queue.
+write_behind = None
+if os.getenv("SENSOR_WRITE_BEHIND", "").lower() in ("1", "true", "yes"):
+    write_behind = WriteBehindBuffer(
+        store_readings,
+        capacity=int(os.getenv("SENSOR_WRITE_BEHIND_CAPACITY", 50000)),
+        max_batch=int(os.getenv("SENSOR_WRITE_BEHIND_MAX_BATCH", 1000)),
+        flush_interval_ms=int(os.getenv("SENSOR_WRITE_BEHIND_INTERVAL_MS", 200)),
+    )
+
+
+# Background hourly/daily downsampling; DOWNSAMPLE_INTERVAL_S=0 disables
+downsample_worker = None
+if float(os.getenv("DOWNSAMPLE_INTERVAL_S", 60)) > 0:
+    downsample_worker = DownsampleWorker(float(os.getenv("DOWNSAMPLE_INTERVAL_S", 60)))
+
+
 # Helpers
 class IdModel(BaseModel):
     id: str
 
 
-def to_str_id(doc: dict):
-    if doc is None:
+class BatchItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    inserted: int
+    failed: int
+    results: List[BatchItemResult]
+
+
+class LatestBulkRequest(BaseModel):
+    plant_ids: List[str]
+    limit: int = 20
+
+
+class LiveSubscription(BaseModel):
+    plant_ids: Optional[List[str]] = None
+    location: Optional[str] = None
+    max_fps: Optional[float] = Field(None, gt=0)
+
+
+class StreamIngestResult(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[BatchItemResult]
+
+
+async def stream_documents(collection_name: str, filter_dict: dict = None, sort: list = None, projection: dict = None):
+    """StreamingResponse with a JSON array of the matching documents, built one cursor batch at a time.
+
+    The first batch is fetched before responding so database errors still
+    produce a 500; later failures can only truncate the stream.
+    """
+    batches = aiter_document_batches(collection_name, filter_dict, sort=sort, projection=projection, batch_size=LIST_BATCH_SIZE)
+    try:
+        first = await batches.__anext__()
+    except StopAsyncIteration:
+        return FastJSONResponse([])
+
+    async def body():
+        yield b"["
+        batch, sep = first, b""
+        try:
+            while True:
+                yield sep + b",".join(dumps(id_in_place(doc)) for doc in batch)
+                sep = b","
+                try:
+                    batch = await batches.__anext__()
+                except StopAsyncIteration:
+                    break
+        except Exception as e:
+            logger.error("%s: stream aborted: %s", collection_name, e)
+            raise
+        finally:
+            await batches.aclose()
+        yield b"]"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+def parse_cursor(after: Optional[str]):
+    if not after:
+        return None, None
+    try:
+        return decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def parse_fields(fields: Optional[str], model) -> Optional[dict]:
+    """Turn ``fields=a,b`` into a MongoDB projection; the id is always returned"""
+    if not fields:
         return None
-    d = dict(doc)
-    if "_id" in d:
-        d["id"] = str(d.pop("_id"))
-    return d
+    allowed = set(model.model_fields) | {"id", "created_at", "updated_at"}
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    return {name: 1 for name in names if name != "id"} or {"_id": 1}
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return doc
+    return {k: v for k, v in doc.items() if k == "_id" or k in projection}
+
+
+def cursor_headers(token: Optional[str]) -> dict:
+    return {"X-Next-Cursor": token} if token else {}
+
+
+async def list_page(collection_name: str, filter_dict: dict, after: Optional[str], limit: int,
+                    projection: dict = None):
+    """One page in _id order; the X-Next-Cursor header carries the token for the next page"""
+    last_id, _ = parse_cursor(after)
+    if after and last_id is None:
+        raise HTTPException(status_code=400, detail="Cursor must reference an id")
+    limit = max(1, min(limit, PAGE_LIMIT_MAX))
+    if last_id is not None:
+        filter_dict = {**filter_dict, **after_id_filter(last_id)}
+    docs = await aget_documents(collection_name, filter_dict, limit=limit + 1, sort=[("_id", 1)], projection=projection)
+    token = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        token = encode_cursor(docs[-1]["_id"])
+    return FastJSONResponse([id_in_place(doc) for doc in docs], headers=cursor_headers(token))
 
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Coffee Growth Tracker Backend Running"}
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -50,13 +402,14 @@ def test_database():
         "collections": []
     }
     try:
+        db = database.db
         if db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await run_db(db.list_collection_names)
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -67,39 +420,67 @@ def test_database():
         response["database"] = f"❌ Error: {str(e)[:80]}"
     response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
     response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+    response["connection_pool"] = get_pool_stats()
     return response
 
 
+@app.get("/ready")
+async def ready():
+    status = 200 if database.is_ready() else 503
+    return JSONResponse(dict(database.readiness), status_code=status)
+
+
 # ---------------- Plant Endpoints ----------------
 @app.post("/plants", response_model=IdModel)
-def create_plant(plant: Plant):
+async def create_plant(plant: Plant):
     try:
         plant_dict = plant.model_dump()
-        new_id = create_document("plant", plant_dict)
+        new_id = await acreate_document("plant", plant_dict)
+        if PLANT_STATS_ROLLUP:
+            try:
+                await run_db(rollups.init_plant, new_id)
+            except Exception as e:
+                logger.error("plantstats: rollup init failed: %s", e)
         return {"id": new_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/plants")
-def list_plants():
+async def list_plants(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name,variety"),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor, or a plant id"),
+    limit: Optional[int] = Query(None, description=f"Page size (max {PAGE_LIMIT_MAX}); omit for the full list"),
+):
+    projection = parse_fields(fields, Plant)
     try:
-        docs = get_documents("plant")
-        return [to_str_id(doc) for doc in docs]
+        if limit is not None or after:
+            return await list_page("plant", {}, after, limit or PAGE_LIMIT_MAX, projection)
+        return await stream_documents("plant", projection=projection)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ---------------- Growth Logs ----------------
 @app.post("/growth-logs", response_model=IdModel)
-def create_growth_log(log: GrowthLog):
+async def create_growth_log(log: GrowthLog):
     try:
         # Validate plant existence if possible
         try:
             _ = ObjectId(log.plant_id)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid plant_id format")
-        new_id = create_document("growthlog", log.model_dump())
+        doc = log.model_dump()
+        new_id = await acreate_document("growthlog", doc)
+        if PLANT_STATS_ROLLUP:
+            try:
+                await run_db(rollups.apply_growth_log, doc)
+            except Exception as e:
+                logger.error("plantstats: rollup update failed: %s", e)
+        if "growthlog" not in changefeed_collections:
+            publish_documents("growthlog", [{**doc, "_id": new_id}])
         return {"id": new_id}
     except HTTPException:
         raise
@@ -108,25 +489,44 @@ def create_growth_log(log: GrowthLog):
 
 
 @app.get("/growth-logs")
-def list_growth_logs(plant_id: Optional[str] = None):
+async def list_growth_logs(
+    plant_id: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. observed_at,height_cm"),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor, or a growth log id"),
+    limit: Optional[int] = Query(None, description=f"Page size (max {PAGE_LIMIT_MAX}); omit for the full list"),
+):
+    projection = parse_fields(fields, GrowthLog)
     try:
         filt = {"plant_id": plant_id} if plant_id else {}
-        docs = get_documents("growthlog", filt)
-        return [to_str_id(doc) for doc in docs]
+        if limit is not None or after:
+            return await list_page("growthlog", filt, after, limit or PAGE_LIMIT_MAX, projection)
+        return await stream_documents("growthlog", filt, projection=projection)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ---------------- Sensor Readings (live) ----------------
 @app.post("/sensor-readings", response_model=IdModel)
-def ingest_sensor_reading(reading: SensorReading):
+async def ingest_sensor_reading(reading: SensorReading):
     try:
         # ObjectId basic validation
         try:
             _ = ObjectId(reading.plant_id)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid plant_id format")
-        new_id = create_document("sensorreading", reading.model_dump())
+        doc = reading.model_dump()
+        doc["_id"] = ObjectId()
+        if write_behind is not None:
+            if not write_behind.offer(doc):
+                raise HTTPException(status_code=429, detail="Ingest buffer full, retry later", headers={"Retry-After": "1"})
+            on_readings_accepted([doc])
+            return {"id": str(doc["_id"])}
+        new_id, error = (await run_db(store_readings, [doc]))[0]
+        if error:
+            raise HTTPException(status_code=500, detail=error)
+        on_readings_accepted([doc])
         return {"id": new_id}
     except HTTPException:
         raise
@@ -134,51 +534,435 @@ def ingest_sensor_reading(reading: SensorReading):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/sensor-readings/batch", response_model=BatchResult)
+async def ingest_sensor_readings_batch(readings: List[Any]):
+    """Items are validated one by one, so an invalid reading fails only its own slot"""
+    if len(readings) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE} readings)")
+    try:
+        results = [None] * len(readings)
+        valid_idx, valid_docs = [], []
+        for i, item in enumerate(readings):
+            try:
+                reading = SensorReading.model_validate(item)
+            except ValidationError as e:
+                results[i] = {"index": i, "error": str(e.errors()[0].get("msg", "Invalid reading"))}
+                continue
+            if not ObjectId.is_valid(reading.plant_id):
+                results[i] = {"index": i, "error": "Invalid plant_id format"}
+                continue
+            valid_idx.append(i)
+            valid_docs.append(reading.model_dump())
+
+        accepted = []
+        stored = await run_db(store_readings, valid_docs)
+        for i, doc, (new_id, error) in zip(valid_idx, valid_docs, stored):
+            results[i] = {"index": i, "id": new_id, "error": error}
+            if not error:
+                accepted.append(doc)
+        on_readings_accepted(accepted)
+
+        failed = sum(1 for r in results if r.get("error"))
+        return {"inserted": len(results) - failed, "failed": failed, "results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/sensor-readings/ndjson", response_model=StreamIngestResult)
+async def ingest_sensor_readings_ndjson(request: Request):
+    """Ingest newline-delimited SensorReading JSON as it arrives.
+
+    Lines are validated one by one and written in chunks of
+    NDJSON_CHUNK_SIZE, so memory stays bounded however large the upload is.
+    Line numbers in ``errors`` are 0-based.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith(("application/x-ndjson", "application/ndjson")):
+        raise HTTPException(status_code=415, detail="Expected application/x-ndjson body")
+
+    received = inserted = failed = 0
+    errors = []
+    chunk, chunk_idx = [], []
+
+    def record_error(index, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < NDJSON_MAX_ERRORS:
+            errors.append({"index": index, "error": message})
+
+    async def flush():
+        nonlocal inserted
+        results = await run_db(store_readings, chunk)
+        accepted = []
+        for i, doc, (new_id, error) in zip(chunk_idx, chunk, results):
+            if error:
+                record_error(i, error)
+            else:
+                inserted += 1
+                accepted.append(doc)
+        on_readings_accepted(accepted)
+        chunk.clear()
+        chunk_idx.clear()
+
+    def handle_line(raw: bytes):
+        nonlocal received
+        raw = raw.strip()
+        if not raw:
+            return
+        index = received
+        received += 1
+        try:
+            reading = SensorReading.model_validate_json(raw)
+        except ValidationError as e:
+            record_error(index, str(e.errors()[0].get("msg", "Invalid reading")))
+            return
+        if not ObjectId.is_valid(reading.plant_id):
+            record_error(index, "Invalid plant_id format")
+            return
+        chunk.append(reading.model_dump())
+        chunk_idx.append(index)
+
+    try:
+        buf = b""
+        async for data in request.stream():
+            buf += data
+            *lines, buf = buf.split(b"\n")
+            if len(buf) > NDJSON_MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Line {received} exceeds {NDJSON_MAX_LINE_BYTES} bytes")
+            for line in lines:
+                handle_line(line)
+                if len(chunk) >= NDJSON_CHUNK_SIZE:
+                    await flush()
+        handle_line(buf)
+        if chunk:
+            await flush()
+        return {"received": received, "inserted": inserted, "failed": failed, "errors": errors}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def resolve_reading_cursor(plant_id: str, token: Optional[str]):
+    """(id, recorded_at) of the reading a cursor points at; a bare id is looked up.
+
+    Readings are ordered by (recorded_at, _id), and ids of backfilled readings
+    do not follow recorded_at, so an id alone cannot bound a range.
+    """
+    last_id, last_ts = parse_cursor(token)
+    if last_id is None or last_ts is not None:
+        return last_id, last_ts
+    buffered = latest_cache.cached(plant_id, latest_cache.size) if latest_cache is not None else None
+    for doc in buffered or []:
+        if doc["_id"] == last_id:
+            return last_id, doc.get("recorded_at")
+    try:
+        doc = await run_db(reading_store.get, plant_id, last_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if doc is None:
+        raise HTTPException(status_code=400, detail="Cursor references an unknown reading")
+    return last_id, doc.get("recorded_at")
+
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
 @app.get("/sensor-readings/latest")
-def latest_sensor_readings(plant_id: str, limit: int = 20):
+async def latest_sensor_readings(
+    request: Request,
+    plant_id: str,
+    limit: int = 20,
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor, or a timestamp, to page to older readings"),
+    since: Optional[str] = Query(None, description="Cursor from X-Latest-Cursor, a reading id or a timestamp; returns the oldest `limit` newer readings, so poll again while a full page comes back"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. recorded_at,temperature_c"),
+):
+    if after and since:
+        raise HTTPException(status_code=400, detail="Use either after or since, not both")
+    projection = parse_fields(fields, SensorReading)
+    if projection:
+        # recorded_at is needed to build the cursors
+        projection = {**projection, "recorded_at": 1}
+    try:
+        limit = max(1, min(limit, LATEST_LIMIT_MAX))
+        last_id, last_ts = await resolve_reading_cursor(plant_id, after)
+        since_id, since_ts = await resolve_reading_cursor(plant_id, since)
+        since_key = sort_key(since_ts, since_id) if since_ts is not None else None
+        use_cache = after is None and latest_cache is not None and limit <= latest_cache.size
+        docs = None
+        if after:
+            docs = await run_db(reading_store.latest, plant_id, limit, before_filter(last_id, last_ts), projection)
+        elif since:
+            # The oldest `limit` readings after the client's last one, so a poll
+            # never skips readings however many arrived in between
+            if use_cache and since_key is not None:
+                docs = latest_cache.cached(plant_id, limit, since_key)
+            if docs is None:
+                use_cache = False
+                match = newer_filter(since_id, since_ts)
+                docs = (await run_db(reading_store.oldest, plant_id, limit, match, projection))[::-1]
+        elif use_cache:
+            docs = latest_cache.cached(plant_id, limit)
+            if docs is None:
+                docs = await run_db(latest_cache.latest, plant_id, limit)
+        else:
+            # Most recent readings, served by the (plant_id, recorded_at, _id) index
+            docs = await run_db(reading_store.latest, plant_id, limit, None, projection)
+        cached = use_cache
+
+        headers = {}
+        if len(docs) == limit and not since:
+            headers["X-Next-Cursor"] = encode_cursor(docs[-1]["_id"], docs[-1].get("recorded_at"))
+        if docs:
+            headers["X-Latest-Cursor"] = encode_cursor(docs[0]["_id"], docs[0].get("recorded_at"))
+        elif since:
+            # Nothing new: the client keeps polling from where it was
+            headers["X-Latest-Cursor"] = since
+        headers["ETag"] = weak_etag(plant_id, limit, fields, after, since, *(doc["_id"] for doc in docs))
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+
+        # Buffered documents are shared, so they get copied; fresh query results are renamed in place
+        rows = [to_str_id(project(doc, projection)) if cached else id_in_place(doc) for doc in docs]
+        return FastJSONResponse(rows, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/sensor-readings/latest/bulk")
+async def latest_sensor_readings_bulk(
+    body: LatestBulkRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. recorded_at,temperature_c"),
+):
+    """Most recent readings for many plants in one round trip, keyed by plant id"""
+    plant_ids = list(dict.fromkeys(body.plant_ids))
+    if len(plant_ids) > LATEST_BULK_MAX_PLANTS:
+        raise HTTPException(status_code=413, detail=f"Too many plants (max {LATEST_BULK_MAX_PLANTS})")
+    projection = parse_fields(fields, SensorReading)
+    try:
+        limit = max(1, min(body.limit, LATEST_LIMIT_MAX))
+        result = {}
+        cold = []
+        for plant_id in plant_ids:
+            docs = None
+            if latest_cache is not None and limit <= latest_cache.size:
+                docs = latest_cache.cached(plant_id, limit)
+            if docs is None:
+                cold.append(plant_id)
+            else:
+                result[plant_id] = [to_str_id(project(doc, projection)) for doc in docs]
+        if cold:
+            # Everything the cache cannot answer comes from a single aggregation
+            groups = await run_db(reading_store.latest_many, cold, limit, projection)
+            for plant_id in cold:
+                result[plant_id] = [id_in_place(project(doc, projection)) for doc in groups.get(plant_id, [])]
+        return FastJSONResponse({plant_id: result[plant_id] for plant_id in plant_ids})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/sensor-readings/stream")
+async def stream_sensor_readings(request: Request, plant_id: str):
+    """Server-Sent Events feed of readings for one plant as they are ingested.
+
+    Each reading is sent as a ``reading`` event and each new growth log as a
+    ``growthlog`` event. If the client falls more
+    than SSE_QUEUE_SIZE events behind, the oldest are dropped and a
+    ``dropped`` event reports how many were missed.
+    """
+    sub = broker.subscribe([plant_id], SSE_QUEUE_SIZE)
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=SSE_HEARTBEAT_S)
+                if event is None:
+                    yield b": keep-alive\n\n"
+                    continue
+                dropped = sub.take_dropped()
+                if dropped:
+                    yield b"event: dropped\ndata: " + dumps({"count": dropped}) + b"\n\n"
+                yield b"id: " + event.id.encode() + b"\nevent: " + event.kind.encode() + b"\ndata: " + event.data + b"\n\n"
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/sensor-readings")
+async def sensor_readings_ws(websocket: WebSocket):
+    """Live readings for many plants over one socket.
+
+    The client sends ``{"plant_ids": [...], "location": "...", "max_fps": 2}``
+    (any combination; a new message replaces the subscription). The server
+    sends at most max_fps frames per second, each
+    ``{"type": "readings", "plants": {plant_id: changes}}`` where ``changes``
+    holds only the fields that differ from the last reading sent for that
+    plant. Readings that arrive within one frame are coalesced per plant.
+    """
+    await websocket.accept()
+    conn = {"sub": None, "interval": 1 / WS_MAX_FPS, "changed": asyncio.Event()}
+    last_sent = {}
+
+    async def resolve_plants(msg: LiveSubscription) -> List[str]:
+        plant_ids = list(msg.plant_ids or [])
+        if msg.location:
+            docs = await aget_documents("plant", {"location": msg.location}, projection={"_id": 1})
+            plant_ids += [str(doc["_id"]) for doc in docs]
+        return list(dict.fromkeys(plant_ids))[:WS_MAX_PLANTS]
+
+    async def reader():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            try:
+                msg = LiveSubscription.model_validate_json(message.get("text") or message.get("bytes") or "")
+            except ValidationError as e:
+                err = e.errors()[0]
+                where = ".".join(str(p) for p in err.get("loc", ()))
+                detail = f"{where}: {err['msg']}" if where else err["msg"]
+                await websocket.send_json({"type": "error", "detail": detail})
+                continue
+            if msg.max_fps:
+                conn["interval"] = 1 / min(max(msg.max_fps, 0.1), WS_MAX_FPS)
+            if msg.model_fields_set & {"plant_ids", "location"}:
+                plant_ids = await resolve_plants(msg)
+                old, conn["sub"] = conn["sub"], broker.subscribe(plant_ids, SSE_QUEUE_SIZE)
+                if old is not None:
+                    old.close()
+                last_sent.clear()
+                conn["changed"].set()
+                await websocket.send_json({"type": "subscribed", "plant_ids": plant_ids})
+
+    async def writer():
+        loop = asyncio.get_running_loop()
+        frame_at = 0.0
+        while True:
+            sub = conn["sub"]
+            if sub is None:
+                await conn["changed"].wait()
+                conn["changed"].clear()
+                continue
+            first = await sub.get(timeout=SSE_HEARTBEAT_S)
+            if sub is not conn["sub"]:
+                continue
+            if first is None:
+                await websocket.send_text('{"type":"ping"}')
+                continue
+            delay = frame_at + conn["interval"] - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            latest, growth_logs = {}, []
+            for event in [first, *sub.drain()]:
+                if event.kind == "reading":
+                    latest.setdefault(event.topic, {}).update(event.doc)
+                else:
+                    growth_logs.append(event.doc)
+            plants = {}
+            for plant_id, fields in latest.items():
+                prev = last_sent.setdefault(plant_id, {})
+                delta = {k: v for k, v in fields.items() if k != "plant_id" and prev.get(k) != v}
+                prev.update(fields)
+                if delta:
+                    plants[plant_id] = delta
+            frame = {"type": "readings", "plants": plants}
+            if growth_logs:
+                frame["growth_logs"] = growth_logs
+            dropped = sub.take_dropped()
+            if dropped:
+                frame["dropped"] = dropped
+            await websocket.send_text(dumps(frame).decode())
+            frame_at = loop.time()
+
+    tasks = [asyncio.create_task(reader()), asyncio.create_task(writer())]
     try:
-        # Most recent readings; if no index, sort in memory
-        docs = get_documents("sensorreading", {"plant_id": plant_id})
-        docs_sorted = sorted(docs, key=lambda d: d.get("recorded_at", datetime.min), reverse=True)
-        return [to_str_id(doc) for doc in docs_sorted[: max(1, min(limit, 200))]]
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                logger.warning("websocket closed on error: %s", exc)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if conn["sub"] is not None:
+            conn["sub"].close()
+
+
+@app.get("/sensor-readings/history")
+async def sensor_reading_history(
+    plant_id: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    window: Optional[str] = Query(None, description="Look-back window ending at 'to' (or now), e.g. 24h, 7d"),
+    resolution: str = Query("auto", description="auto, raw, 1h or 1d"),
+):
+    """Readings over a time range, downsampled according to the span unless a resolution is forced"""
+    try:
+        start, end = time_range(from_, to, window or (None if from_ else "24h"))
+        if end is None:
+            end = datetime.utcnow()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resolution == "auto":
+        resolution = pick_resolution(start, end)
+    elif resolution != "raw" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="resolution must be auto, raw, 1h or 1d")
+    try:
+        if resolution == "raw":
+            docs = await run_db(
+                reading_store.find,
+                {"plant_id": plant_id, "recorded_at": {"$gte": start, "$lt": end}},
+                sort=[("recorded_at", 1)],
+                limit=HISTORY_RAW_MAX_POINTS,
+            )
+            points = [id_in_place(doc) for doc in docs]
+        else:
+            points = await run_db(get_rollups, plant_id, resolution, start, end)
+        return FastJSONResponse({"resolution": resolution, "from": start, "to": end, "points": points})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/ingest/status")
+async def ingest_status():
+    return {
+        "write_behind": write_behind.status() if write_behind is not None else None,
+        "spool": spool.status() if spool is not None else None,
+        "live_subscribers": broker.subscriber_count(),
+        "changefeed": change_watcher.status() if change_watcher is not None else None,
+    }
+
+
 # ---------------- Stats ----------------
 @app.get("/stats/plant")
-def plant_stats(plant_id: str):
-    try:
-        logs = get_documents("growthlog", {"plant_id": plant_id})
-        readings = get_documents("sensorreading", {"plant_id": plant_id})
-        # Compute simple stats
-        height_values = [l.get("height_cm") for l in logs if l.get("height_cm") is not None]
-        max_height = max(height_values) if height_values else None
-        min_height = min(height_values) if height_values else None
-        avg_height = sum(height_values) / len(height_values) if height_values else None
-
-        temps = [r.get("temperature_c") for r in readings if r.get("temperature_c") is not None]
-        avg_temp = sum(temps) / len(temps) if temps else None
-
-        moist = [r.get("soil_moisture_pct") for r in readings if r.get("soil_moisture_pct") is not None]
-        avg_moist = sum(moist) / len(moist) if moist else None
-
-        stages = {}
-        for l in logs:
-            s = l.get("stage")
-            if s:
-                stages[s] = stages.get(s, 0) + 1
-
-        return {
-            "max_height_cm": max_height,
-            "min_height_cm": min_height,
-            "avg_height_cm": avg_height,
-            "avg_temperature_c": avg_temp,
-            "avg_soil_moisture_pct": avg_moist,
-            "stages_counts": stages,
-            "logs_count": len(logs),
-            "readings_count": len(readings),
-        }
+async def plant_stats(
+    plant_id: str,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    window: Optional[str] = Query(None, description="Look-back window ending at 'to' (or now), e.g. 24h, 7d"),
+):
+    try:
+        start, end = time_range(from_, to, window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        if start is not None or end is not None:
+            return {**(await run_db(compute_plant_stats, plant_id, start, end)), "from": start, "to": end}
+        if PLANT_STATS_ROLLUP:
+            stats = await run_db(rollups.get_plant_stats, plant_id)
+            if stats is not None:
+                return stats
+        return await run_db(compute_plant_stats, plant_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,83 @@
+"""
+Maintenance commands
+
+Usage:
+    python manage.py rebuild-stats [--plant-id ID]
+    python manage.py downsample
+    python manage.py migrate-timeseries [--batch-size N]
+    python manage.py indexes [--apply]
+"""
+
+import argparse
+import os
+import socket
+
+import database
+import downsample
+import reading_store
+import rollups
+from schemas import INDEXES
+
+
+def rebuild_stats(args):
+    n = rollups.rebuild(args.plant_id)
+    print(f"Rebuilt stats rollups for {n} plant(s)")
+
+
+def run_downsample(args):
+    owner = f"manage:{socket.gethostname()}:{os.getpid()}"
+    for resolution in downsample.RESOLUTIONS:
+        if downsample.run_rollup(resolution, owner):
+            print(f"{resolution}: rolled up to current watermark")
+        else:
+            print(f"{resolution}: skipped, another worker holds the lease")
+
+
+def migrate_timeseries(args):
+    n = reading_store.migrate_to_timeseries(args.batch_size)
+    print(f"Copied {n} reading(s) into time-series collection {reading_store.COLLECTION}")
+    print(f"Drop {reading_store.LEGACY_COLLECTION} once the copy has been verified")
+
+
+def indexes(args):
+    specs = reading_store.active_indexes(INDEXES)
+    if args.apply:
+        database.ensure_indexes(specs)
+    for collection, info in database.index_report(specs).items():
+        print(collection)
+        for name in info["missing"]:
+            print(f"  MISSING  {name}")
+        for idx in info["indexes"]:
+            ops = "n/a" if idx["ops"] is None else idx["ops"]
+            flag = "" if idx["declared"] else "  (not declared)"
+            unused = "  UNUSED" if idx["ops"] == 0 else ""
+            print(f"  {idx['name']:<45} ops={ops}{unused}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Coffee Growth Tracker maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rebuild-stats", help="Recompute plantstats rollups from raw data")
+    p.add_argument("--plant-id", help="Only rebuild this plant")
+    p.set_defaults(func=rebuild_stats)
+
+    p = sub.add_parser("downsample", help="Run the hourly/daily sensor rollups once")
+    p.set_defaults(func=run_downsample)
+
+    p = sub.add_parser("migrate-timeseries", help="Move sensorreading into a time-series collection")
+    p.add_argument("--batch-size", type=int, default=5000)
+    p.set_defaults(func=migrate_timeseries)
+
+    p = sub.add_parser("indexes", help="Report missing and unused indexes")
+    p.add_argument("--apply", action="store_true", help="Create missing declared indexes first")
+    p.set_defaults(func=indexes)
+
+    args = parser.parse_args(argv)
+    if not database.init_db():
+        parser.exit(1, "DATABASE_URL and DATABASE_NAME must be set\n")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
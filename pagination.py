@@ -0,0 +1,79 @@
+"""
+Keyset pagination cursors
+
+A cursor is the sort key of the last item on a page, encoded as an opaque
+URL-safe token. The next page is an indexed range query starting after
+that key, so deep pages cost the same as the first one.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def encode_cursor(last_id: ObjectId, timestamp: datetime = None) -> str:
+    payload = {"id": str(last_id)}
+    if timestamp is not None:
+        payload["t"] = timestamp.isoformat()
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Return ``(ObjectId or None, datetime or None)`` for a cursor token.
+
+    A bare ObjectId hex string or ISO timestamp is accepted in place of a
+    token so clients can start from a known item. Raises ValueError.
+    """
+    if ObjectId.is_valid(token):
+        return ObjectId(token), None
+    try:
+        return None, datetime.fromisoformat(token)
+    except ValueError:
+        pass
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        last_id = ObjectId(payload["id"])
+        timestamp = datetime.fromisoformat(payload["t"]) if "t" in payload else None
+        return last_id, timestamp
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def after_id_filter(last_id: ObjectId) -> dict:
+    return {"_id": {"$gt": last_id}}
+
+
+def before_filter(last_id: ObjectId = None, timestamp: datetime = None) -> dict:
+    """Readings older than (timestamp, last_id) in (recorded_at desc, _id desc) order"""
+    if timestamp is None:
+        return {"_id": {"$lt": last_id}} if last_id is not None else {}
+    if last_id is None:
+        return {"recorded_at": {"$lt": timestamp}}
+    return {
+        # The plain range bound lets the index (and bucket pre-filter) narrow
+        # the scan; the $or breaks ties between readings with equal timestamps.
+        "recorded_at": {"$lte": timestamp},
+        "$or": [
+            {"recorded_at": {"$lt": timestamp}},
+            {"recorded_at": timestamp, "_id": {"$lt": last_id}},
+        ],
+    }
+
+
+def newer_filter(last_id: ObjectId = None, timestamp: datetime = None) -> dict:
+    """Readings newer than (timestamp, last_id) in (recorded_at, _id) order"""
+    if timestamp is None:
+        return {"_id": {"$gt": last_id}} if last_id is not None else {}
+    if last_id is None:
+        return {"recorded_at": {"$gt": timestamp}}
+    return {
+        "recorded_at": {"$gte": timestamp},
+        "$or": [
+            {"recorded_at": {"$gt": timestamp}},
+            {"recorded_at": timestamp, "_id": {"$gt": last_id}},
+        ],
+    }
@@ -0,0 +1,402 @@
+"""
+Sensor reading storage
+
+Readings are stored in one of three layouts, chosen with SENSOR_STORAGE:
+
+- ``document`` (default): one ``sensorreading`` document per reading.
+- ``timeseries``: the same documents, but ``sensorreading`` is a native
+  MongoDB time-series collection (``timeField=recorded_at``,
+  ``metaField=plant_id``) so the server buckets and compresses them.
+  Existing data is moved over with ``python manage.py migrate-timeseries``.
+- ``bucket``: one ``sensorreading_bucket`` document per plant and hour,
+  holding a ``readings`` array plus count/sum/min/max headers. Ingest is a
+  single ``$push`` upsert per bucket, which cuts per-document and index
+  overhead by roughly the bucket size.
+
+Callers never look at the layout: they write with ``insert`` and read with
+``find``/``latest``/``aggregate``, which unpack buckets into plain reading
+documents (``_id``, ``plant_id``, ``recorded_at``, metrics, ``created_at``).
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+import database
+from database import aggregate as _aggregate, bulk_write, create_documents, get_documents
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MODE = os.getenv("SENSOR_STORAGE", "document").lower()
+COLLECTION = "sensorreading"
+LEGACY_COLLECTION = "sensorreading_legacy"
+MIGRATION_STATE_COLLECTION = "migration_state"
+TIMESERIES_GRANULARITY = os.getenv("SENSOR_TIMESERIES_GRANULARITY", "minutes")
+BUCKET_COLLECTION = "sensorreading_bucket"
+BUCKET_SPAN = timedelta(hours=1)
+BUCKET_MAX_READINGS = int(os.getenv("SENSOR_BUCKET_MAX_READINGS", 1000))
+METRICS = ("temperature_c", "humidity_pct", "soil_moisture_pct")
+
+if STORAGE_MODE not in ("document", "timeseries", "bucket"):
+    raise ValueError(f"Unknown SENSOR_STORAGE mode: {STORAGE_MODE}")
+
+
+def storage_collection() -> str:
+    return BUCKET_COLLECTION if STORAGE_MODE == "bucket" else COLLECTION
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _bucket_start(ts: datetime) -> datetime:
+    return _naive_utc(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# ---------------- writes ----------------
+def _bson_time(ts: datetime) -> datetime:
+    """A datetime as MongoDB hands it back: naive UTC, millisecond precision"""
+    ts = _naive_utc(ts)
+    return ts.replace(microsecond=ts.microsecond // 1000 * 1000)
+
+
+def as_stored(doc: dict, now: datetime = None) -> dict:
+    """A copy of a reading about to be inserted, shaped like the documents reads return"""
+    stored = {k: _bson_time(v) if isinstance(v, datetime) else v for k, v in doc.items()}
+    now = _bson_time(now or datetime.now(timezone.utc))
+    stored["created_at"] = now
+    if STORAGE_MODE != "bucket":
+        stored["updated_at"] = now
+    return stored
+
+
+def insert(docs: List[dict], dedupe: bool = False):
+    """Store readings; returns ``(id, error)`` per reading like create_documents.
+
+    Only ``document`` storage enforces a unique ``_id``: a time-series insert
+    or bucket ``$push`` stores a repeated reading again. Writers that may
+    repeat documents (spool replay) pass ``dedupe=True`` to have ids that are
+    already stored rejected as duplicates instead.
+    """
+    if dedupe and STORAGE_MODE != "document":
+        return _insert_new(docs)
+    if STORAGE_MODE != "bucket":
+        return create_documents(COLLECTION, docs)
+    if not docs:
+        return []
+
+    now = datetime.now(timezone.utc)
+    groups = defaultdict(list)
+    for doc in docs:
+        entry = dict(doc)
+        entry.pop("plant_id")
+        # Clients send both naive and offset timestamps; mixed ones cannot be compared
+        entry["recorded_at"] = _naive_utc(doc["recorded_at"])
+        entry["created_at"] = now
+        groups[(doc["plant_id"], _bucket_start(entry["recorded_at"]))].append(entry)
+
+    ops = []
+    for (plant_id, bucket_start), entries in groups.items():
+        for i in range(0, len(entries), BUCKET_MAX_READINGS):
+            ops.append(_bucket_upsert(plant_id, bucket_start, entries[i:i + BUCKET_MAX_READINGS], now))
+    bulk_write(BUCKET_COLLECTION, ops)
+    return [(str(doc["_id"]), None) for doc in docs]
+
+
+def _existing_ids(docs: List[dict]) -> set:
+    """Ids of ``docs`` that are already stored"""
+    if not docs:
+        return set()
+    ids = [doc["_id"] for doc in docs]
+    if STORAGE_MODE == "bucket":
+        # Served by the multikey readings._id index
+        found = _aggregate(BUCKET_COLLECTION, [
+            {"$match": {"readings._id": {"$in": ids}}},
+            {"$project": {"readings._id": 1}},
+            {"$unwind": "$readings"},
+            {"$match": {"readings._id": {"$in": ids}}},
+            {"$project": {"_id": "$readings._id"}},
+        ])
+        return {doc["_id"] for doc in found}
+    times = [_naive_utc(doc["recorded_at"]) for doc in docs]
+    # Bounded by meta and time so the server only opens the matching buckets
+    found = get_documents(COLLECTION, {
+        "plant_id": {"$in": list({doc["plant_id"] for doc in docs})},
+        "recorded_at": {"$gte": min(times), "$lte": max(times)},
+        "_id": {"$in": ids},
+    }, projection={"_id": 1})
+    return {doc["_id"] for doc in found}
+
+
+def _insert_new(docs: List[dict]):
+    existing = _existing_ids([doc for doc in docs if "_id" in doc])
+    fresh = [doc for doc in docs if doc.get("_id") not in existing]
+    stored = iter(insert(fresh))
+    return [
+        (None, f"duplicate key: {doc['_id']} is already stored") if doc.get("_id") in existing else next(stored)
+        for doc in docs
+    ]
+
+
+def _bucket_upsert(plant_id: str, bucket_start: datetime, entries: List[dict], now: datetime) -> UpdateOne:
+    inc = {"count": len(entries)}
+    mins, maxs = {}, {}
+    times = [e["recorded_at"] for e in entries]
+    mins["first_recorded_at"], maxs["last_recorded_at"] = min(times), max(times)
+    for m in METRICS:
+        values = [e[m] for e in entries if _is_number(e.get(m))]
+        if values:
+            inc[f"{m}_count"] = len(values)
+            inc[f"{m}_sum"] = sum(values)
+            mins[f"{m}_min"] = min(values)
+            maxs[f"{m}_max"] = max(values)
+    # A full bucket no longer matches, so the upsert opens a fresh one for
+    # the same hour; buckets are therefore not unique per (plant, hour).
+    return UpdateOne(
+        {"plant_id": plant_id, "bucket_start": bucket_start, "count": {"$lte": BUCKET_MAX_READINGS - len(entries)}},
+        {
+            "$push": {"readings": {"$each": entries}},
+            "$inc": inc,
+            "$min": mins,
+            "$max": maxs,
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"created_at": now},
+        },
+        upsert=True,
+    )
+
+
+# ---------------- reads ----------------
+def _bucket_prefilter(match: dict) -> dict:
+    """A bucket-level filter matching a superset of the buckets holding readings that match ``match``"""
+    pre = {}
+    if "plant_id" in match:
+        pre["plant_id"] = match["plant_id"]
+    recorded = match.get("recorded_at")
+    if isinstance(recorded, dict):
+        cond = {}
+        for op in ("$gt", "$gte"):
+            if op in recorded:
+                cond["$gt"] = _naive_utc(recorded[op]) - BUCKET_SPAN
+        for op in ("$lt", "$lte"):
+            if op in recorded:
+                cond["$lte"] = _naive_utc(recorded[op])
+        if cond:
+            pre["bucket_start"] = cond
+    created = match.get("created_at")
+    if isinstance(created, dict):
+        for op in ("$gt", "$gte"):
+            if op in created:
+                # Every push bumps updated_at, so older buckets have nothing new
+                pre["updated_at"] = {"$gte": created[op]}
+    return pre
+
+
+def _unpack_stages() -> list:
+    return [
+        {"$unwind": "$readings"},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": [{"plant_id": "$plant_id"}, "$readings"]}}},
+    ]
+
+
+def source_pipeline(match: dict) -> list:
+    """Pipeline prefix yielding plain reading documents that match ``match``"""
+    if STORAGE_MODE != "bucket":
+        return [{"$match": match}]
+    return [{"$match": _bucket_prefilter(match)}, *_unpack_stages(), {"$match": match}]
+
+
+def aggregate(match: dict, stages: list) -> list:
+    """Run ``stages`` over the readings matching ``match``"""
+    return _aggregate(storage_collection(), source_pipeline(match) + stages)
+
+
+def find(match: dict, sort: list = None, limit: int = None) -> List[dict]:
+    if STORAGE_MODE != "bucket":
+        return get_documents(COLLECTION, match, limit=limit, sort=sort)
+    stages = []
+    if sort:
+        stages.append({"$sort": dict(sort)})
+    if limit:
+        stages.append({"$limit": limit})
+    return aggregate(match, stages)
+
+
+def get(plant_id: str, reading_id) -> Optional[dict]:
+    """One reading by id through an index; time-series storage has no ``_id`` index and raises ValueError"""
+    if STORAGE_MODE == "timeseries":
+        raise ValueError("Lookups by reading id are not supported with time-series storage; use a cursor or timestamp")
+    if STORAGE_MODE == "document":
+        docs = get_documents(COLLECTION, {"_id": reading_id, "plant_id": plant_id}, limit=1)
+    else:
+        docs = _aggregate(BUCKET_COLLECTION, [
+            {"$match": {"plant_id": plant_id, "readings._id": reading_id}},
+            *_unpack_stages(),
+            {"$match": {"_id": reading_id}},
+            {"$limit": 1},
+        ])
+    return docs[0] if docs else None
+
+
+def latest(plant_id: str, limit: int, match: dict = None, projection: dict = None) -> List[dict]:
+    """Newest-first readings for a plant, optionally narrowed by ``match`` and projected"""
+    return _ordered(plant_id, limit, match, projection, -1)
+
+
+def oldest(plant_id: str, limit: int, match: dict = None, projection: dict = None) -> List[dict]:
+    """Oldest-first readings for a plant, optionally narrowed by ``match`` and projected"""
+    return _ordered(plant_id, limit, match, projection, 1)
+
+
+def _ordered(plant_id: str, limit: int, match: dict, projection: dict, direction: int) -> List[dict]:
+    match = {"plant_id": plant_id, **(match or {})}
+    sort = [("recorded_at", direction), ("_id", direction)]
+    if STORAGE_MODE != "bucket":
+        return get_documents(COLLECTION, match, limit=limit, sort=sort, projection=projection)
+
+    # Hours are ordered like buckets, so the first limit+1 candidate buckets
+    # in the requested direction always hold the first `limit` readings (one
+    # boundary bucket may be partly filtered out). Only those are unwound.
+    pre = _bucket_prefilter(match)
+    edge = get_documents(
+        BUCKET_COLLECTION, pre, limit=limit + 1, sort=[("bucket_start", direction)], projection={"bucket_start": 1}
+    )
+    if len(edge) > limit:
+        bound = "$gte" if direction < 0 else "$lte"
+        pre["bucket_start"] = {**pre.get("bucket_start", {}), bound: edge[-1]["bucket_start"]}
+    return _aggregate(BUCKET_COLLECTION, [
+        {"$match": pre},
+        *_unpack_stages(),
+        {"$match": match},
+        {"$sort": dict(sort)},
+        {"$limit": limit},
+        *([{"$project": projection}] if projection else []),
+    ])
+
+
+def latest_many(plant_ids: List[str], limit: int, projection: dict = None) -> dict:
+    """Newest-first readings for several plants from one aggregation, keyed by plant id.
+
+    Each plant is a ``$lookup`` whose sub-pipeline sorts and limits on the
+    (plant_id, recorded_at, _id) index, so a plant costs O(limit) like
+    ``latest``. In bucket mode a first lookup finds the oldest of the
+    newest ``limit`` buckets, and only buckets from there on are unwound.
+    Needs MongoDB 5.1+ for ``$documents``.
+    """
+    sort = {"recorded_at": -1, "_id": -1}
+    per_plant = [{"$sort": sort}, {"$limit": limit}, *([{"$project": projection}] if projection else [])]
+    pipeline = [{"$documents": [{"plant_id": plant_id} for plant_id in plant_ids]}]
+    if STORAGE_MODE != "bucket":
+        pipeline.append({"$lookup": {
+            "from": COLLECTION, "localField": "plant_id", "foreignField": "plant_id",
+            "pipeline": per_plant, "as": "readings",
+        }})
+    else:
+        # Every bucket holds at least one reading, so the newest `limit`
+        # buckets (and any sharing the oldest one's hour) hold the newest
+        # `limit` readings
+        pipeline += [
+            {"$lookup": {
+                "from": BUCKET_COLLECTION, "localField": "plant_id", "foreignField": "plant_id",
+                "pipeline": [{"$sort": {"bucket_start": -1}}, {"$limit": limit}, {"$project": {"bucket_start": 1}}],
+                "as": "edge",
+            }},
+            {"$lookup": {
+                "from": BUCKET_COLLECTION, "localField": "plant_id", "foreignField": "plant_id",
+                "let": {"floor": {"$min": "$edge.bucket_start"}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$gte": ["$bucket_start", "$$floor"]}}},
+                    *_unpack_stages(),
+                    *per_plant,
+                ],
+                "as": "readings",
+            }},
+        ]
+    pipeline.append({"$project": {"plant_id": 1, "readings": 1}})
+    return {row["plant_id"]: row["readings"] for row in _aggregate(None, pipeline)}
+
+
+# ---------------- setup ----------------
+def _collection_type(name: str):
+    info = next(database.db.list_collections(filter={"name": name}), None)
+    return info.get("type", "collection") if info else None
+
+
+def create_timeseries_collection():
+    """Create ``sensorreading`` as a time-series collection; returns False if it already exists"""
+    if _collection_type(COLLECTION) is not None:
+        return False
+    database.db.create_collection(
+        COLLECTION,
+        timeseries={"timeField": "recorded_at", "metaField": "plant_id", "granularity": TIMESERIES_GRANULARITY},
+    )
+    return True
+
+
+def ensure_collections():
+    """Create collections whose options must be set up front (idempotent)"""
+    if database.db is None or STORAGE_MODE != "timeseries":
+        return
+    if not create_timeseries_collection() and _collection_type(COLLECTION) != "timeseries":
+        logger.warning(
+            "SENSOR_STORAGE=timeseries but %s is a regular collection; run 'python manage.py migrate-timeseries'",
+            COLLECTION,
+        )
+
+
+def migrate_to_timeseries(batch_size: int = 5000) -> int:
+    """Move readings from a regular ``sensorreading`` into a time-series one.
+
+    The regular collection is renamed to ``sensorreading_legacy``, a
+    time-series ``sensorreading`` is created, and documents are copied in
+    ``_id`` order with a checkpoint after each batch so an interrupted run
+    resumes where it stopped. The legacy collection is left for the
+    operator to drop. Returns the number of documents copied by this run.
+    """
+    if database.db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if _collection_type(COLLECTION) == "collection":
+        if _collection_type(LEGACY_COLLECTION) is not None:
+            raise Exception(f"Both {COLLECTION} and {LEGACY_COLLECTION} exist as regular collections; resolve manually")
+        database.db[COLLECTION].rename(LEGACY_COLLECTION)
+    create_timeseries_collection()
+    if _collection_type(LEGACY_COLLECTION) is None:
+        return 0
+
+    state_id = f"{COLLECTION}_timeseries"
+    state = database.get_document(MIGRATION_STATE_COLLECTION, {"_id": state_id}) or {}
+    last_id = state.get("last_id")
+    copied = 0
+    while True:
+        batch = get_documents(
+            LEGACY_COLLECTION,
+            {"_id": {"$gt": last_id}} if last_id is not None else {},
+            limit=batch_size,
+            sort=[("_id", 1)],
+        )
+        if not batch:
+            return copied
+        # Time-series collections do not enforce unique _id, so documents a
+        # failed or interrupted batch already copied are skipped on the rerun
+        existing = _existing_ids(batch)
+        fresh = [doc for doc in batch if doc["_id"] not in existing]
+        if fresh:
+            database.db[COLLECTION].insert_many(fresh, ordered=False)
+        last_id = batch[-1]["_id"]
+        database.update_document(MIGRATION_STATE_COLLECTION, {"_id": state_id}, {"$set": {"last_id": last_id}}, upsert=True)
+        copied += len(fresh)
+
+
+def active_indexes(specs: list) -> list:
+    """The index specs that apply to the configured storage mode"""
+    return [spec for spec in specs if spec.storage is None or spec.storage == STORAGE_MODE]
@@ -0,0 +1,49 @@
+"""
+Fast JSON responses
+
+orjson serializes datetime and date natively and ObjectId through a
+default hook, so documents read from MongoDB can be rendered as-is without
+FastAPI's jsonable_encoder pass or a per-document copy.
+"""
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+def to_str_id(doc: dict):
+    """A copy of ``doc`` with ``_id`` renamed to a string ``id``; for documents shared with others"""
+    if doc is None:
+        return None
+    d = dict(doc)
+    if "_id" in d:
+        d["id"] = str(d.pop("_id"))
+    return d
+
+
+def id_in_place(doc: dict) -> dict:
+    """Rename ``_id`` to ``id`` on a document we own; the ObjectId is stringified at render time"""
+    if "_id" in doc:
+        doc["id"] = doc.pop("_id")
+    return doc
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson.
+
+    Returning an instance from a handler also skips jsonable_encoder, which
+    is where most of the per-document cost went.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,155 @@
+"""
+Incrementally maintained per-plant statistics
+
+Every plant has one document in the ``plantstats`` collection holding
+running counts, sums, minima and maxima that are updated atomically as
+growth logs and sensor readings are written. ``GET /stats/plant`` reads
+that single document instead of scanning history. ``rebuild`` recomputes
+the rollups from the raw collections and marks them ``complete``; only
+complete rollups are served, others fall back to a scan. Plants created
+while rollups are enabled start complete (they have no history yet); for
+existing plants run ``python manage.py rebuild-stats`` with ingest paused.
+"""
+
+from collections import defaultdict
+from typing import List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+
+import reading_store
+from database import aggregate, bulk_write, get_document, update_document
+
+COLLECTION = "plantstats"
+
+
+def _stage_key(stage: str) -> str:
+    # Stage names become field names; MongoDB forbids '.' and a leading '$'
+    return stage.replace(".", "_").lstrip("$")
+
+
+def _number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def init_plant(plant_id: str):
+    """Start a complete, empty rollup for a plant that was just created"""
+    update_document(COLLECTION, {"_id": plant_id}, {"$setOnInsert": {"complete": True}}, upsert=True)
+
+
+def apply_growth_log(doc: dict):
+    inc = {"logs_count": 1}
+    update = {}
+    height = doc.get("height_cm")
+    if _number(height):
+        inc["height_sum"] = height
+        inc["height_count"] = 1
+        update["$min"] = {"min_height_cm": height}
+        update["$max"] = {"max_height_cm": height}
+    if doc.get("stage"):
+        inc[f"stages_counts.{_stage_key(doc['stage'])}"] = 1
+    update["$inc"] = inc
+    _apply({doc["plant_id"]: update})
+
+
+def apply_readings(docs: List[dict]):
+    """Fold a batch of readings into the rollups, one update per plant"""
+    per_plant = defaultdict(lambda: defaultdict(float))
+    for doc in docs:
+        inc = per_plant[doc["plant_id"]]
+        inc["readings_count"] += 1
+        for field, prefix in (("temperature_c", "temperature"), ("soil_moisture_pct", "soil_moisture")):
+            value = doc.get(field)
+            if _number(value):
+                inc[f"{prefix}_sum"] += value
+                inc[f"{prefix}_count"] += 1
+    _apply({plant_id: {"$inc": dict(inc)} for plant_id, inc in per_plant.items()})
+
+
+def _apply(updates: dict):
+    """Upsert plant_id -> update.
+
+    A rollup created here only holds this write and stays incomplete until
+    ``rebuild``; seeding it inline would race with concurrent increments.
+    """
+    bulk_write(COLLECTION, [UpdateOne({"_id": pid}, update, upsert=True) for pid, update in updates.items()])
+
+
+def _avg(total, count):
+    return total / count if count else None
+
+
+def to_stats(doc: dict) -> dict:
+    """Convert a rollup document to the /stats/plant response shape"""
+    return {
+        "max_height_cm": doc.get("max_height_cm"),
+        "min_height_cm": doc.get("min_height_cm"),
+        "avg_height_cm": _avg(doc.get("height_sum", 0), doc.get("height_count", 0)),
+        "avg_temperature_c": _avg(doc.get("temperature_sum", 0), doc.get("temperature_count", 0)),
+        "avg_soil_moisture_pct": _avg(doc.get("soil_moisture_sum", 0), doc.get("soil_moisture_count", 0)),
+        "stages_counts": doc.get("stages_counts", {}),
+        "logs_count": int(doc.get("logs_count", 0)),
+        "readings_count": int(doc.get("readings_count", 0)),
+    }
+
+
+def get_plant_stats(plant_id: str) -> Optional[dict]:
+    """Stats from the rollup, or None if the plant has no complete rollup yet"""
+    doc = get_document(COLLECTION, {"_id": plant_id, "complete": True})
+    return to_stats(doc) if doc is not None else None
+
+
+def _numeric_count(field: str) -> dict:
+    return {"$sum": {"$cond": [{"$isNumber": f"${field}"}, 1, 0]}}
+
+
+def rebuild(plant_id: str = None) -> int:
+    """Recompute rollups from raw data; returns the number of plants written.
+
+    Writes that land while the rebuild runs may be counted twice or not at
+    all, so run it while ingest is paused.
+    """
+    match = {"plant_id": plant_id} if plant_id else {}
+    rollups = defaultdict(dict)
+
+    for row in aggregate("growthlog", [
+        {"$match": match},
+        {"$group": {
+            "_id": "$plant_id",
+            "logs_count": {"$sum": 1},
+            "height_sum": {"$sum": "$height_cm"},
+            "height_count": _numeric_count("height_cm"),
+            "min_height_cm": {"$min": "$height_cm"},
+            "max_height_cm": {"$max": "$height_cm"},
+        }},
+    ]):
+        rollups[row.pop("_id")].update(row)
+
+    for row in aggregate("growthlog", [
+        {"$match": {**match, "stage": {"$nin": [None, ""]}}},
+        {"$group": {"_id": {"plant_id": "$plant_id", "stage": "$stage"}, "count": {"$sum": 1}}},
+    ]):
+        stages = rollups[row["_id"]["plant_id"]].setdefault("stages_counts", {})
+        key = _stage_key(row["_id"]["stage"])
+        stages[key] = stages.get(key, 0) + row["count"]
+
+    for row in reading_store.aggregate(match, [
+        {"$group": {
+            "_id": "$plant_id",
+            "readings_count": {"$sum": 1},
+            "temperature_sum": {"$sum": "$temperature_c"},
+            "temperature_count": _numeric_count("temperature_c"),
+            "soil_moisture_sum": {"$sum": "$soil_moisture_pct"},
+            "soil_moisture_count": _numeric_count("soil_moisture_pct"),
+        }},
+    ]):
+        rollups[row.pop("_id")].update(row)
+
+    if plant_id:
+        # Mark the plant complete even if it has no history at all
+        rollups[plant_id]
+    ops = [
+        ReplaceOne({"_id": pid}, {"_id": pid, **fields, "complete": True}, upsert=True)
+        for pid, fields in rollups.items()
+    ]
+    bulk_write(COLLECTION, ops)
+    return len(ops)
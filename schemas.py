@@ -6,7 +6,7 @@ name is the lowercase of the class name (e.g., Plant -> "plant").
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional, Tuple
 from datetime import date, datetime
 
 
@@ -42,3 +42,47 @@ class SensorReading(BaseModel):
     temperature_c: Optional[float] = Field(None, description="Ambient temperature Celsius")
     humidity_pct: Optional[float] = Field(None, ge=0, le=100, description="Air humidity %")
     soil_moisture_pct: Optional[float] = Field(None, ge=0, le=100, description="Soil moisture %")
+
+
+# ---------------- Indexes ----------------
+class IndexSpec(BaseModel):
+    """An index a query path relies on; applied idempotently at startup"""
+    collection: str
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+    # Only created when SENSOR_STORAGE matches (None = always)
+    storage: Optional[str] = None
+    # TTL index: documents are removed this many seconds after the indexed date
+    expire_after_s: Optional[int] = None
+    purpose: str = ""
+
+    @property
+    def name(self) -> str:
+        # Same naming scheme MongoDB uses by default
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+
+INDEXES = [
+    IndexSpec(collection="plant", keys=[("location", 1)],
+              purpose="plants by location"),
+    IndexSpec(collection="growthlog", keys=[("plant_id", 1), ("observed_at", 1)],
+              purpose="time-windowed stats per plant"),
+    IndexSpec(collection="growthlog", keys=[("plant_id", 1), ("_id", 1)],
+              purpose="growth log listing and keyset pagination per plant"),
+    IndexSpec(collection="sensorreading", keys=[("plant_id", 1), ("recorded_at", -1), ("_id", -1)],
+              purpose="latest readings, history and windowed stats per plant"),
+    IndexSpec(collection="sensorreading", keys=[("created_at", 1)],
+              purpose="downsampling watermark scans"),
+    IndexSpec(collection="sensorreading_bucket", keys=[("plant_id", 1), ("bucket_start", -1)],
+              storage="bucket", purpose="bucket lookups per plant"),
+    IndexSpec(collection="sensorreading_bucket", keys=[("updated_at", 1)],
+              storage="bucket", purpose="downsampling watermark scans"),
+    IndexSpec(collection="sensorreading_bucket", keys=[("readings._id", 1)],
+              storage="bucket", purpose="reading id lookups: spool replay dedupe and since=<id>"),
+    IndexSpec(collection="changestream_state", keys=[("lease_until", 1)], expire_after_s=86400,
+              purpose="drop change-stream watcher slots unused for a day"),
+    IndexSpec(collection="sensorreading_1h", keys=[("plant_id", 1), ("bucket_start", 1)], unique=True,
+              purpose="hourly rollup merge key and range reads"),
+    IndexSpec(collection="sensorreading_1d", keys=[("plant_id", 1), ("bucket_start", 1)], unique=True,
+              purpose="daily rollup merge key and range reads"),
+]
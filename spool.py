@@ -0,0 +1,222 @@
+"""
+Local disk spool for documents that could not be written to MongoDB
+
+Records are appended to segment files as ``<len:u32><crc32:u32><bson>``.
+Appends are fsynced in batches (every ``fsync_every`` records or
+``fsync_interval_ms``, whichever comes first), so at most that window can
+be lost on a host crash. A replay thread drains sealed segments back into
+MongoDB once writes succeed again and deletes each segment when done.
+The writer returns ``(id, error)`` per document; documents rejected for
+any reason other than a duplicate key (already stored by an earlier
+replay) are appended to ``deadletter.seg`` in the same format before the
+segment is deleted, so nothing is dropped silently.
+"""
+
+import logging
+import os
+import struct
+import threading
+import zlib
+from typing import Callable, Iterator, List, Optional
+
+import bson
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<II")
+_PREFIX = "spool-"
+_SUFFIX = ".seg"
+_DEAD_LETTER = "deadletter.seg"
+
+
+def _frame(docs: List[dict]) -> bytes:
+    out = bytearray()
+    for doc in docs:
+        payload = bson.encode(doc)
+        out += _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+    return bytes(out)
+
+
+def _is_duplicate(error: str) -> bool:
+    # E11000 from MongoDB, or reading_store's own dedupe rejection
+    return "duplicate key" in str(error)
+
+
+class Spool:
+    def __init__(
+        self,
+        directory: str,
+        writer: Callable[[List[dict]], Optional[list]],
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        fsync_every: int = 256,
+        fsync_interval_ms: int = 100,
+        replay_interval_s: float = 5.0,
+        replay_batch: int = 1000,
+    ):
+        self.directory = directory
+        self.writer = writer
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.replay_interval = replay_interval_s
+        self.replay_batch = replay_batch
+        self._lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._unsynced = 0
+        self._stop = threading.Event()
+        self._threads = []
+        self.spooled = 0
+        self.replayed = 0
+        self.corrupt = 0
+        self.dead_lettered = 0
+
+        os.makedirs(directory, exist_ok=True)
+        existing = self._segments()
+        if existing:
+            self._seq = self._seq_of(existing[-1])
+
+    # ---------------- append side ----------------
+    def append(self, docs: List[dict]):
+        """Durably (modulo the fsync window) append documents to the spool."""
+        with self._lock:
+            if self._file is None:
+                self._open_next()
+            self._file.write(_frame(docs))
+            self._file.flush()
+            self._unsynced += len(docs)
+            self.spooled += len(docs)
+            if self._unsynced >= self.fsync_every:
+                self._fsync()
+            if self._file.tell() >= self.segment_max_bytes:
+                self._seal()
+
+    def _open_next(self):
+        self._seq += 1
+        path = os.path.join(self.directory, f"{_PREFIX}{self._seq:012d}{_SUFFIX}")
+        self._file = open(path, "ab")
+
+    def _fsync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def _seal(self):
+        if self._file is not None:
+            self._fsync()
+            self._file.close()
+            self._file = None
+
+    # ---------------- replay side ----------------
+    def _segments(self) -> List[str]:
+        names = [n for n in os.listdir(self.directory) if n.startswith(_PREFIX) and n.endswith(_SUFFIX)]
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    @staticmethod
+    def _seq_of(path: str) -> int:
+        return int(os.path.basename(path)[len(_PREFIX):-len(_SUFFIX)])
+
+    def _read_segment(self, path: str) -> Iterator[dict]:
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    # Torn write at the tail of a segment; nothing after it is valid
+                    self.corrupt += 1
+                    return
+                if zlib.crc32(payload) != crc:
+                    self.corrupt += 1
+                    logger.error("spool: CRC mismatch in %s, skipping record", path)
+                    continue
+                yield bson.decode(payload)
+
+    def replay(self) -> int:
+        """Drain all sealed segments; returns the number of documents written."""
+        with self._lock:
+            # Seal the active segment so everything spooled so far is replayable
+            if self._file is not None and self._file.tell() > 0:
+                self._seal()
+            sealed = self._segments()
+
+        written = 0
+        for path in sealed:
+            batch = []
+            for doc in self._read_segment(path):
+                batch.append(doc)
+                if len(batch) >= self.replay_batch:
+                    written += self._write(batch)
+                    batch = []
+            if batch:
+                written += self._write(batch)
+            # Documents carry their _id, so replaying a segment twice after a
+            # crash here only produces duplicate-key rejections.
+            os.remove(path)
+        self.replayed += written
+        return written
+
+    def _write(self, batch: List[dict]) -> int:
+        """Replay one batch; returns how many documents were stored"""
+        results = self.writer(batch) or [(None, None)] * len(batch)
+        rejected = [(doc, err) for doc, (_, err) in zip(batch, results) if err and not _is_duplicate(err)]
+        if rejected:
+            logger.error("spool: %d documents rejected on replay, kept in %s; first error: %s",
+                         len(rejected), _DEAD_LETTER, rejected[0][1])
+            self._dead_letter([doc for doc, _ in rejected])
+        return sum(1 for _, err in results if not err)
+
+    def _dead_letter(self, docs: List[dict]):
+        with open(os.path.join(self.directory, _DEAD_LETTER), "ab") as f:
+            f.write(_frame(docs))
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += len(docs)
+
+    def pending_segments(self) -> int:
+        return len(self._segments())
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for target, name in ((self._fsync_loop, "spool-fsync"), (self._replay_loop, "spool-replay")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        with self._lock:
+            self._seal()
+
+    def status(self) -> dict:
+        return {
+            "directory": self.directory,
+            "pending_segments": self.pending_segments(),
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "corrupt_records": self.corrupt,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    def _fsync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            with self._lock:
+                self._fsync()
+
+    def _replay_loop(self):
+        while not self._stop.wait(self.replay_interval):
+            if not self.pending_segments():
+                continue
+            try:
+                n = self.replay()
+                if n:
+                    logger.info("spool: replayed %d documents", n)
+            except Exception as e:
+                logger.info("spool: replay deferred, database still unavailable: %s", e)
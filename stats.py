@@ -0,0 +1,110 @@
+"""
+Plant statistics computed server-side with aggregation pipelines
+
+Only one small summary document per collection crosses the wire, however
+long the plant's history is.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+import reading_store
+from database import aggregate
+
+_WINDOW_RE = re.compile(r"^(\d+)([mhdw])$")
+_WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_window(window: str) -> timedelta:
+    """Parse a window like '30m', '24h', '7d' or '2w'"""
+    m = _WINDOW_RE.match(window.strip().lower())
+    if not m:
+        raise ValueError("window must look like 30m, 24h, 7d or 2w")
+    return timedelta(**{_WINDOW_UNITS[m.group(2)]: int(m.group(1))})
+
+
+def _naive_utc(value: datetime = None):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def time_range(start: datetime = None, end: datetime = None, window: str = None):
+    """Resolve from/to/window into a naive-UTC (start, end) pair; window counts back from end (or now)"""
+    start, end = _naive_utc(start), _naive_utc(end)
+    if window:
+        if end is None:
+            end = datetime.utcnow()
+        if start is None:
+            start = end - parse_window(window)
+    if start is not None and end is not None and start > end:
+        raise ValueError("'from' must not be after 'to'")
+    return start, end
+
+
+def range_filter(field: str, start: datetime = None, end: datetime = None) -> dict:
+    cond = {}
+    if start is not None:
+        cond["$gte"] = start
+    if end is not None:
+        cond["$lt"] = end
+    return {field: cond} if cond else {}
+
+
+def growth_log_pipeline(match: dict) -> list:
+    return [
+        {"$match": match},
+        {"$facet": {
+            "height": [
+                {"$group": {
+                    "_id": None,
+                    "max": {"$max": "$height_cm"},
+                    "min": {"$min": "$height_cm"},
+                    "avg": {"$avg": "$height_cm"},
+                }},
+            ],
+            "stages": [
+                {"$match": {"stage": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$stage", "count": {"$sum": 1}}},
+            ],
+            "total": [{"$count": "count"}],
+        }},
+    ]
+
+
+def sensor_reading_stages() -> list:
+    return [
+        {"$group": {
+            "_id": None,
+            "avg_temperature_c": {"$avg": "$temperature_c"},
+            "avg_soil_moisture_pct": {"$avg": "$soil_moisture_pct"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def compute_plant_stats(plant_id: str, start: datetime = None, end: datetime = None) -> dict:
+    """Stats in the /stats/plant response shape, over [start, end) or the full history.
+
+    The range filters on observed_at / recorded_at, which lead the
+    plant_id-prefixed indexes, so only the window is scanned.
+    """
+    log_match = {"plant_id": plant_id, **range_filter("observed_at", start, end)}
+    reading_match = {"plant_id": plant_id, **range_filter("recorded_at", start, end)}
+    facets = aggregate("growthlog", growth_log_pipeline(log_match))[0]
+    readings = reading_store.aggregate(reading_match, sensor_reading_stages())
+
+    height = facets["height"][0] if facets["height"] else {}
+    total = facets["total"][0]["count"] if facets["total"] else 0
+    reading = readings[0] if readings else {}
+
+    return {
+        "max_height_cm": height.get("max"),
+        "min_height_cm": height.get("min"),
+        "avg_height_cm": height.get("avg"),
+        "avg_temperature_c": reading.get("avg_temperature_c"),
+        "avg_soil_moisture_pct": reading.get("avg_soil_moisture_pct"),
+        "stages_counts": {s["_id"]: s["count"] for s in facets["stages"]},
+        "logs_count": total,
+        "readings_count": reading.get("count", 0),
+    }
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from latest_cache import LatestReadingsCache, sort_key
+
+BASE = datetime(2024, 1, 1)
+
+
+def reading(minute, id=None):
+    return {"_id": id or f"{minute:04d}", "plant_id": "p1", "recorded_at": BASE + timedelta(minutes=minute)}
+
+
+def ids(docs):
+    return [doc["_id"] for doc in docs]
+
+
+def make_cache(stored, size=5, **kwargs):
+    def loader(plant_id, limit):
+        return sorted(stored, key=lambda d: (d["recorded_at"], d["_id"]), reverse=True)[:limit]
+    return LatestReadingsCache(loader, size=size, ttl=0, **kwargs)
+
+
+def test_sort_key_normalizes_aware_timestamps():
+    aware = datetime(2024, 1, 1, 1, 0, tzinfo=timezone(timedelta(hours=1)))
+    assert sort_key(aware, "a") == sort_key(datetime(2024, 1, 1), "a")
+
+
+def test_sort_key_without_id_sorts_after_every_reading_at_that_time():
+    assert sort_key(BASE, "ffffff") < sort_key(BASE)
+    assert sort_key(BASE) < sort_key(BASE + timedelta(milliseconds=1), "0")
+
+
+def test_latest_is_newest_first():
+    cache = make_cache([reading(m) for m in range(8)])
+    assert cache.cached("p1", 3) is None
+    assert ids(cache.latest("p1", 3)) == ["0007", "0006", "0005"]
+    assert ids(cache.cached("p1", 3)) == ["0007", "0006", "0005"]
+
+
+def test_since_returns_oldest_readings_after_key_newest_first():
+    cache = make_cache([reading(m) for m in range(3)], size=10)
+    cache.latest("p1", 1)
+    cache.add([reading(m) for m in range(3, 8)])
+    since = sort_key(BASE + timedelta(minutes=2), "0002")
+    assert ids(cache.cached("p1", 3, since)) == ["0005", "0004", "0003"]
+    assert ids(cache.cached("p1", 10, since)) == ["0007", "0006", "0005", "0004", "0003"]
+
+
+def test_since_breaks_ties_on_id():
+    cache = make_cache([reading(1, "a"), reading(1, "b"), reading(1, "c")])
+    cache.latest("p1", 1)
+    assert ids(cache.cached("p1", 5, sort_key(BASE + timedelta(minutes=1), "a"))) == ["c", "b"]
+    assert cache.cached("p1", 5, sort_key(BASE + timedelta(minutes=1))) == []
+
+
+def test_since_before_evicted_readings_is_not_answered():
+    cache = make_cache([reading(m) for m in range(10)], size=5)
+    cache.latest("p1", 1)
+    # Readings 0-4 were never buffered, so the cache cannot tell what follows 0
+    assert cache.cached("p1", 3, sort_key(BASE, "0000")) is None
+    assert ids(cache.cached("p1", 3, sort_key(BASE + timedelta(minutes=5), "0005"))) == ["0008", "0007", "0006"]
+
+
+def test_add_skips_duplicates_and_keeps_size():
+    cache = make_cache([reading(m) for m in range(5)], size=5)
+    cache.latest("p1", 1)
+    cache.add([reading(4), reading(5)])
+    assert ids(cache.cached("p1", 10)) == ["0005", "0004", "0003", "0002", "0001"]
+
+
+def test_expired_buffer_is_refreshed_with_newer_readings_only():
+    stored = [reading(m) for m in range(3)]
+    refreshed = []
+
+    def refresher(plant_id, newest, limit):
+        refreshed.append(newest["_id"])
+        return [doc for doc in stored if doc["recorded_at"] > newest["recorded_at"]][:limit]
+
+    cache = make_cache(stored, refresher=refresher)
+    cache.ttl = 1e-9
+    cache.latest("p1", 1)
+    stored.append(reading(3))
+    assert cache.cached("p1", 1) is None
+    assert ids(cache.latest("p1", 2)) == ["0003", "0002"]
+    assert refreshed == ["0002"]
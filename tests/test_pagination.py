@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pagination import before_filter, decode_cursor, encode_cursor, newer_filter
+
+TS = datetime(2024, 1, 1, 12, 30)
+
+
+def test_cursor_round_trip():
+    oid = ObjectId()
+    assert decode_cursor(encode_cursor(oid, TS)) == (oid, TS)
+    assert decode_cursor(encode_cursor(oid)) == (oid, None)
+
+
+def test_decode_accepts_bare_id_and_timestamp():
+    oid = ObjectId()
+    assert decode_cursor(str(oid)) == (oid, None)
+    assert decode_cursor("2024-01-01T12:30:00") == (None, TS)
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_before_filter_breaks_ties_on_id():
+    oid = ObjectId()
+    assert before_filter(oid, TS) == {
+        "recorded_at": {"$lte": TS},
+        "$or": [{"recorded_at": {"$lt": TS}}, {"recorded_at": TS, "_id": {"$lt": oid}}],
+    }
+    assert before_filter(None, TS) == {"recorded_at": {"$lt": TS}}
+
+
+def test_newer_filter_breaks_ties_on_id():
+    oid = ObjectId()
+    assert newer_filter(oid, TS) == {
+        "recorded_at": {"$gte": TS},
+        "$or": [{"recorded_at": {"$gt": TS}}, {"recorded_at": TS, "_id": {"$gt": oid}}],
+    }
+    assert newer_filter(None, TS) == {"recorded_at": {"$gt": TS}}
+    assert newer_filter() == {}
@@ -0,0 +1,117 @@
+import os
+import struct
+
+from bson import ObjectId
+
+from spool import Spool
+
+
+def make_docs(n):
+    return [{"_id": ObjectId(), "plant_id": "p1", "seq": i} for i in range(n)]
+
+
+def segment_paths(directory):
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".seg"))
+
+
+def record_offsets(path):
+    """Start offset and payload length of every record in a segment"""
+    offsets = []
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos < len(data):
+        length, _ = struct.unpack_from("<II", data, pos)
+        offsets.append((pos, length))
+        pos += 8 + length
+    return offsets
+
+
+def test_append_then_replay(tmp_path):
+    written = []
+    spool = Spool(str(tmp_path), written.extend, replay_batch=2)
+    docs = make_docs(5)
+    spool.append(docs[:3])
+    spool.append(docs[3:])
+
+    assert spool.replay() == 5
+    assert written == docs
+    assert segment_paths(str(tmp_path)) == []
+    assert spool.status()["replayed"] == 5
+    assert spool.status()["corrupt_records"] == 0
+
+
+def test_replay_after_restart(tmp_path):
+    docs = make_docs(3)
+    first = Spool(str(tmp_path), lambda batch: None)
+    first.append(docs)
+    first.stop()
+
+    written = []
+    second = Spool(str(tmp_path), written.extend)
+    assert second.pending_segments() == 1
+    assert second.replay() == 3
+    assert written == docs
+
+
+def test_replay_skips_record_with_bad_crc(tmp_path):
+    spool = Spool(str(tmp_path), lambda batch: None)
+    docs = make_docs(3)
+    spool.append(docs)
+    spool.stop()
+
+    (path,) = segment_paths(str(tmp_path))
+    start, length = record_offsets(path)[1]
+    with open(path, "r+b") as f:
+        f.seek(start + 8 + length - 2)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    written = []
+    spool = Spool(str(tmp_path), written.extend)
+    assert spool.replay() == 2
+    assert written == [docs[0], docs[2]]
+    assert spool.status()["corrupt_records"] == 1
+
+
+def test_replay_stops_at_truncated_tail(tmp_path):
+    spool = Spool(str(tmp_path), lambda batch: None)
+    docs = make_docs(2)
+    spool.append(docs)
+    spool.stop()
+
+    (path,) = segment_paths(str(tmp_path))
+    os.truncate(path, os.path.getsize(path) - 3)
+
+    written = []
+    spool = Spool(str(tmp_path), written.extend)
+    assert spool.replay() == 1
+    assert written == docs[:1]
+    assert spool.status()["corrupt_records"] == 1
+    assert segment_paths(str(tmp_path)) == []
+
+
+def test_replay_dead_letters_rejected_documents(tmp_path):
+    docs = make_docs(3)
+
+    def writer(batch):
+        results = []
+        for doc in batch:
+            if doc["seq"] == 0:
+                results.append((None, "E11000 duplicate key error"))
+            elif doc["seq"] == 1:
+                results.append((None, "Document failed validation"))
+            else:
+                results.append((str(doc["_id"]), None))
+        return results
+
+    spool = Spool(str(tmp_path), writer)
+    spool.append(docs)
+    assert spool.replay() == 1
+    assert spool.status()["dead_lettered"] == 1
+    assert segment_paths(str(tmp_path)) == [os.path.join(str(tmp_path), "deadletter.seg")]
+
+    kept = list(spool._read_segment(os.path.join(str(tmp_path), "deadletter.seg")))
+    assert kept == [docs[1]]
+    assert spool.pending_segments() == 0
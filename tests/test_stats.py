@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from stats import parse_window, time_range
+
+
+def test_parse_window():
+    assert parse_window("30m") == timedelta(minutes=30)
+    assert parse_window(" 7D ") == timedelta(days=7)
+    with pytest.raises(ValueError):
+        parse_window("7 days")
+
+
+def test_time_range_normalizes_to_naive_utc():
+    start = datetime(2024, 1, 1, 2, 0, tzinfo=timezone(timedelta(hours=2)))
+    end = datetime(2024, 1, 2)
+    assert time_range(start, end) == (datetime(2024, 1, 1), end)
+
+
+def test_time_range_window_counts_back_from_end():
+    end = datetime(2024, 1, 8, tzinfo=timezone.utc)
+    assert time_range(None, end, "7d") == (datetime(2024, 1, 1), datetime(2024, 1, 8))
+
+
+def test_time_range_window_defaults_to_now():
+    start, end = time_range(window="1h")
+    assert end - start == timedelta(hours=1)
+    assert abs(datetime.utcnow() - end) < timedelta(seconds=5)
+
+
+def test_time_range_rejects_inverted_range():
+    with pytest.raises(ValueError):
+        time_range(datetime(2024, 1, 2), datetime(2024, 1, 1))
@@ -0,0 +1,112 @@
+"""
+Write-behind buffer for high-rate inserts
+
+Documents are accepted into a bounded in-process queue and written to
+MongoDB in batches by a background thread, every ``flush_interval_ms``
+or as soon as ``max_batch`` documents are waiting, whichever comes first.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        writer: Callable[[List[dict]], None],
+        capacity: int = 50000,
+        max_batch: int = 1000,
+        flush_interval_ms: int = 200,
+    ):
+        self.writer = writer
+        self.capacity = capacity
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.flushed = 0
+        self.failed_batches = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def offer(self, doc: dict) -> bool:
+        """Enqueue a document; returns False when the buffer is full."""
+        with self._cond:
+            if len(self._queue) >= self.capacity:
+                return False
+            self._queue.append(doc)
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify()
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write out everything still queued."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while self._queue:
+            if not self._flush_once():
+                logger.error("write-behind: dropping %d documents on shutdown", len(self._queue))
+                self._queue.clear()
+
+    def status(self) -> dict:
+        return {
+            "depth": self.depth,
+            "capacity": self.capacity,
+            "max_batch": self.max_batch,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "flushed": self.flushed,
+            "failed_batches": self.failed_batches,
+        }
+
+    def _run(self):
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            with self._cond:
+                while not self._stopping and len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopping:
+                    return
+            if self._queue and not self._flush_once():
+                time.sleep(self.flush_interval)
+
+    def _flush_once(self) -> bool:
+        with self._cond:
+            n = min(len(self._queue), self.max_batch)
+            batch = [self._queue.popleft() for _ in range(n)]
+        if not batch:
+            return True
+        try:
+            self.writer(batch)
+            self.flushed += len(batch)
+            return True
+        except Exception as e:
+            self.failed_batches += 1
+            logger.warning("write-behind: flush of %d documents failed: %s", len(batch), e)
+            # Put the batch back at the head so ordering is preserved and
+            # the next tick retries it; capacity still bounds the queue.
+            with self._cond:
+                self._queue.extendleft(reversed(batch))
+            return False